@@ -0,0 +1,8 @@
+"""Offline benchmarks for the Sales Invoice precision fixes.
+
+Runs the overrides and doc_events hooks against synthetic invoices built from
+in-process Frappe stand-ins, with no site or database:
+
+    python -m zatca_tax_fix.benchmarks --items 300 --tax-rows 3 --currency USD \
+        --charge-types "Actual,On Previous Row Total" --payment-schedule 3 --advances 2
+"""
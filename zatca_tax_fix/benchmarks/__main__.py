@@ -0,0 +1,78 @@
+import argparse
+import json
+
+from zatca_tax_fix.benchmarks import standins
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m zatca_tax_fix.benchmarks",
+        description="Measure the Sales Invoice precision fixes on synthetic invoices, without a database.",
+    )
+    parser.add_argument("--items", type=int, default=300, help="items per invoice")
+    parser.add_argument("--tax-rows", type=int, default=1, help="tax rows per invoice, VAT first")
+    parser.add_argument(
+        "--charge-types", default="On Net Total",
+        help="comma separated charge types cycled through the rows after VAT")
+    parser.add_argument("--currency", default="SAR", help="SAR, USD, EUR or AED")
+    parser.add_argument("--payment-schedule", type=int, default=0, help="payment schedule rows")
+    parser.add_argument("--advances", type=int, default=0, help="advance rows")
+    parser.add_argument("--iterations", type=int, default=200, help="timed calls per scenario")
+    parser.add_argument(
+        "--allocation-iterations", type=int, default=20, help="calls traced for allocations")
+    parser.add_argument(
+        "--scenario", action="append", dest="scenarios", help="run only this scenario (repeatable)")
+    parser.add_argument(
+        "--steps", action="store_true", help="also report per-step timings from engine.instrumentation")
+    parser.add_argument(
+        "--batch-threshold", type=int,
+        help="items from which the NumPy batch path is used, 0 to disable")
+    parser.add_argument(
+        "--no-fast-path", action="store_true", help="compute standard invoices with the full pass")
+    parser.add_argument(
+        "--merge-gl-entries", action="store_true", help="merge similar GL entries before rounding")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args(argv)
+
+    frappe = standins.install()
+    from zatca_tax_fix.benchmarks import runner
+    from zatca_tax_fix.engine import gl, instrumentation, totals, vectorized
+
+    if args.steps:
+        frappe.conf[instrumentation.CONFIG_KEY] = 1
+    if args.batch_threshold is not None:
+        frappe.conf[vectorized.CONFIG_KEY] = args.batch_threshold
+    if args.no_fast_path:
+        frappe.conf[totals.FAST_PATH_KEY] = 0
+    if args.merge_gl_entries:
+        frappe.conf[gl.MERGE_KEY] = 1
+
+    results = runner.run(
+        scenarios=args.scenarios,
+        iterations=args.iterations,
+        allocation_iterations=args.allocation_iterations,
+        items=args.items,
+        tax_rows=args.tax_rows,
+        charge_types=tuple(charge_type.strip() for charge_type in args.charge_types.split(",")),
+        currency=args.currency,
+        payment_schedule=args.payment_schedule,
+        advances=args.advances,
+    )
+
+    stats = instrumentation.get_stats()
+    steps = stats["steps"] if args.steps else []
+
+    if args.json:
+        print(json.dumps({"scenarios": results, "steps": steps, "counters": stats["counters"]}, indent=1))
+        return
+
+    print(runner.format_results(results))
+    if steps:
+        print()
+        print(runner.format_steps(steps))
+        print()
+        print(", ".join(f"{name}: {value}" for name, value in stats["counters"].items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""Randomised equivalence checks of the engine's shortcuts against a full computation.
+
+Each case builds one synthetic invoice, seasoned with rows that stress the
+rounding (exact halves, negative returns, missing qty, amount-only rows and
+amounts too large for int64 products), and compares every field of the
+invoice and its rows between
+
+- the NumPy batch path and the Python path,
+- a pass that only recomputes the rows edited since the previous pass and
+  a full pass over the same edits, and
+- the standard invoice path and the full computation on standard invoices:
+
+    python -m zatca_tax_fix.benchmarks.equivalence --cases 500
+"""
+
+import argparse
+import random
+from contextlib import contextmanager
+
+from zatca_tax_fix.benchmarks import standins
+
+
+def make_case(seed):
+    from zatca_tax_fix.benchmarks import generator
+
+    rng = random.Random(seed)
+    invoice = generator.make_invoice(
+        items=rng.randint(1, 400),
+        tax_rows=rng.randint(1, 4),
+        charge_types=("On Net Total", "On Previous Row Total", "Actual"),
+        currency=rng.choice(tuple(generator.EXCHANGE_RATES)),
+        payment_schedule=rng.randint(0, 3),
+        advances=rng.randint(0, 2),
+        seed=seed,
+    )
+    return season(invoice, rng)
+
+
+def make_standard_case(seed):
+    """A SAR invoice with only the 15% VAT row, below the batch threshold"""
+
+    from zatca_tax_fix.benchmarks import generator
+
+    rng = random.Random(seed)
+    invoice = generator.make_invoice(items=rng.randint(1, 99), seed=seed)
+    invoice.discount_amount = rng.choice((None, 0, rng.uniform(0, 50)))
+    invoice.paid_amount = rng.choice((None, invoice.grand_total))
+    return season(invoice, rng)
+
+
+def season(invoice, rng):
+    for item in invoice.items:
+        roll = rng.random()
+        if roll < 0.05:
+            # Halves at every precision the engine rounds to
+            item.rate = rng.randint(1, 10 ** 6) / 1000 + 0.005
+            item.qty = rng.randint(1, 10 ** 4) / 1000 + 0.0005
+        elif roll < 0.08:
+            item.qty = -item.qty
+        elif roll < 0.10:
+            item.qty = None
+        elif roll < 0.12:
+            item.rate = 0
+            item.amount = rng.uniform(-100, 100)
+        elif roll < 0.13:
+            item.rate = float(rng.randint(0, 10 ** 4))
+        item.amount = item.amount if item.rate == 0 else (item.rate or 0) * (item.qty or 0)
+
+    if rng.random() < 0.02:
+        # Products beyond int64 send the invoice back to the Python path
+        invoice.items[0].rate = 9.5e13
+        invoice.items[0].qty = 10 ** 5
+
+    return invoice
+
+
+def edit(invoice, seed):
+    """Edits a user or another hook could make between two passes"""
+
+    rng = random.Random(seed)
+    items = invoice.items
+
+    for item in rng.sample(items, min(len(items), rng.choice((1, 1, 2, 5)))):
+        roll = rng.random()
+        if roll < 0.4:
+            item.qty = rng.choice((1, 2, 3.5, 7.333))
+        elif roll < 0.6:
+            item.rate = round(rng.uniform(0.5, 2500), 3)
+        elif roll < 0.8:
+            # Recalculated elsewhere with plain float arithmetic
+            item.base_amount = (item.amount or 0) * (invoice.conversion_rate or 1)
+            item.tax_amount = (item.amount or 0) * 0.15
+        else:
+            item.item_tax_template = "KSA VAT 15%"
+
+    roll = rng.random()
+    if roll < 0.05:
+        items.append(standins.StandInDocument(idx=len(items) + 1, rate=10.005, qty=3, amount=30.015))
+    elif roll < 0.1 and len(items) > 1:
+        items.pop()
+    elif roll < 0.15:
+        invoice.conversion_rate = 3.7512
+    elif roll < 0.2:
+        invoice.taxes[0].rate = 5
+
+
+def compare_incremental(cases=200, seed=0):
+    """Edit invoices between two passes; returns the seeds where the second pass
+    differs from a full computation of the same edits"""
+
+    from zatca_tax_fix.benchmarks import generator
+    from zatca_tax_fix.engine.totals import compute_totals
+
+    generator.register_accounts()
+    mismatches = []
+
+    for case in range(seed, seed + cases):
+        incremental, full = make_case(case), make_case(case)
+
+        compute_totals(incremental)
+        compute_totals(full)
+        edit(incremental, case)
+        edit(full, case)
+
+        compute_totals(incremental)
+        full.flags.zatca_item_cache = None
+        compute_totals(full)
+
+        if snapshot(incremental) != snapshot(full):
+            mismatches.append(case)
+
+    return mismatches
+
+
+def snapshot(invoice):
+    rows = {
+        field: [dict(row.__dict__, flags=None) for row in invoice.get(field) or []]
+        for field in ("items", "taxes", "payment_schedule", "advances")
+    }
+    header = {
+        field: value for field, value in invoice.__dict__.items()
+        if field not in rows and field != "flags"
+    }
+    return header, rows
+
+
+@contextmanager
+def site_config(values):
+    """Set site config keys for the duration of the block, then restore them"""
+
+    import frappe
+
+    missing = object()
+    previous = {key: frappe.conf.get(key, missing) for key in values}
+    frappe.conf.update(values)
+    try:
+        yield
+    finally:
+        for key, value in previous.items():
+            if value is missing:
+                frappe.conf.pop(key, None)
+            else:
+                frappe.conf[key] = value
+
+
+def compare_standard(cases=200, seed=0):
+    """Run standard invoices through their path and the full computation;
+    returns the seeds that differ or did not take the standard path"""
+
+    from zatca_tax_fix.benchmarks import generator
+    from zatca_tax_fix.engine.instrumentation import _counters
+    from zatca_tax_fix.engine.totals import FAST_PATH_KEY, compute_totals
+
+    generator.register_accounts()
+    mismatches = []
+
+    for case in range(seed, seed + cases):
+        standard, full = make_standard_case(case), make_standard_case(case)
+
+        taken = _counters.get("compute_totals.standard", 0)
+        compute_totals(standard)
+        if _counters.get("compute_totals.standard", 0) == taken:
+            mismatches.append(case)
+            continue
+
+        with site_config({FAST_PATH_KEY: 0}):
+            compute_totals(full)
+
+        if snapshot(standard) != snapshot(full):
+            mismatches.append(case)
+
+    return mismatches
+
+
+def compare(cases=200, seed=0):
+    """Run `cases` invoices through both paths; returns the seeds that differ"""
+
+    from zatca_tax_fix.benchmarks import generator
+    from zatca_tax_fix.engine import vectorized
+    from zatca_tax_fix.engine.totals import compute_totals
+
+    if not vectorized.np:
+        raise SystemExit("NumPy is not installed; the batch path is disabled")
+
+    generator.register_accounts()
+    mismatches = []
+
+    for case in range(seed, seed + cases):
+        python_invoice = make_case(case)
+        batch_invoice = make_case(case)
+
+        with site_config({vectorized.CONFIG_KEY: 0}):
+            compute_totals(python_invoice)
+        with site_config({vectorized.CONFIG_KEY: 1}):
+            compute_totals(batch_invoice)
+
+        if snapshot(python_invoice) != snapshot(batch_invoice):
+            mismatches.append(case)
+
+    return mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m zatca_tax_fix.benchmarks.equivalence")
+    parser.add_argument("--cases", type=int, default=200, help="random invoices to compare")
+    parser.add_argument("--seed", type=int, default=0, help="first seed")
+    args = parser.parse_args(argv)
+
+    standins.install()
+    from zatca_tax_fix.engine import vectorized
+
+    checks = [("incremental", compare_incremental), ("standard", compare_standard)]
+    if vectorized.np:
+        checks.insert(0, ("batch", compare))
+    else:
+        print("NumPy is not installed; skipping the batch path")
+
+    failed = False
+    for name, check in checks:
+        mismatches = check(args.cases, args.seed)
+        if mismatches:
+            failed = True
+            print(f"{name}: {len(mismatches)} of {args.cases} cases differ, seeds: {mismatches[:20]}")
+        else:
+            print(f"{name}: {args.cases} cases identical")
+
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""Synthetic Sales Invoices built from stand-in documents."""
+
+import random
+
+from zatca_tax_fix.benchmarks import standins
+
+COMPANY = "Benchmark Trading"
+VAT_ACCOUNT = "VAT 15% - BT"
+OTHER_ACCOUNTS = ("Freight and Forwarding Charges - BT", "Municipality Fee - BT")
+
+CHARGE_TYPES = ("On Net Total", "On Previous Row Total", "Actual")
+
+EXCHANGE_RATES = {"SAR": 1.0, "USD": 3.75, "EUR": 4.0613, "AED": 1.021}
+
+
+def register_accounts():
+    """Make the benchmark accounts visible to the VAT account classification"""
+
+    standins.ACCOUNTS[:] = [
+        standins._dict(name=VAT_ACCOUNT, account_name="VAT 15%", parent_account="Duties and Taxes - BT"),
+        *(
+            standins._dict(name=account, account_name=account.rsplit(" - ", 1)[0],
+                           parent_account="Duties and Taxes - BT")
+            for account in OTHER_ACCOUNTS
+        ),
+    ]
+
+
+def make_invoice(
+    items=20,
+    tax_rows=1,
+    charge_types=("On Net Total",),
+    currency="SAR",
+    payment_schedule=0,
+    advances=0,
+    seed=None,
+    invoice_class=standins.StandInSalesInvoice,
+):
+    """A Sales Invoice with awkward, unrounded amounts the engine has to fix.
+
+    The first tax row is always VAT; further rows cycle through `charge_types`
+    on other tax accounts.
+    """
+
+    rng = random.Random(seed)
+    conversion_rate = EXCHANGE_RATES.get(currency, 1.0)
+
+    item_rows = []
+    net_total = 0
+    for idx in range(items):
+        rate = round(rng.uniform(0.5, 2500), rng.choice((2, 3, 4)))
+        qty = rng.choice((1, 2, 3, 5, 12, 0.5, 1.25, 7.333))
+        amount = rate * qty
+        net_total += amount
+        item_rows.append(standins.StandInDocument(
+            idx=idx + 1,
+            name=f"item-{idx + 1}",
+            item_code=f"ITEM-{idx % 97:03d}",
+            rate=rate,
+            qty=qty,
+            amount=amount,
+            net_amount=amount,
+            base_rate=rate * conversion_rate,
+            base_amount=amount * conversion_rate,
+            base_net_rate=rate * conversion_rate,
+            base_net_amount=amount * conversion_rate,
+            item_tax_template="KSA VAT 15%",
+            tax_inclusive_rate=0,
+            tax_amount=amount * 0.15,
+            income_account="Sales - BT",
+            cost_center="Main - BT",
+        ))
+
+    tax_rows_list = [_make_tax(1, "On Net Total", VAT_ACCOUNT, 15, net_total, conversion_rate)]
+    for idx in range(1, tax_rows):
+        charge_type = charge_types[(idx - 1) % len(charge_types)]
+        rate = 0 if charge_type == "Actual" else rng.choice((1, 2.5, 5))
+        tax_rows_list.append(_make_tax(
+            idx + 1, charge_type, OTHER_ACCOUNTS[(idx - 1) % len(OTHER_ACCOUNTS)], rate,
+            net_total, conversion_rate, actual_amount=round(rng.uniform(5, 500), 3)))
+
+    grand_total = net_total + sum(tax.tax_amount for tax in tax_rows_list)
+
+    schedule = [
+        standins.StandInDocument(idx=idx + 1, name=f"schedule-{idx + 1}",
+                                 payment_amount=grand_total / payment_schedule)
+        for idx in range(payment_schedule)
+    ]
+    advance_rows = [
+        standins.StandInDocument(idx=idx + 1, name=f"advance-{idx + 1}",
+                                 allocated_amount=rng.uniform(1, grand_total / (advances + 1)))
+        for idx in range(advances)
+    ]
+
+    return invoice_class(
+        doctype="Sales Invoice",
+        name=f"ACC-SINV-BENCH-{rng.randrange(10 ** 6):06d}",
+        company=COMPANY,
+        currency=currency,
+        conversion_rate=conversion_rate,
+        docstatus=0,
+        items=item_rows,
+        taxes=tax_rows_list,
+        payment_schedule=schedule,
+        advances=advance_rows,
+        net_total=net_total,
+        total_taxes_and_charges=grand_total - net_total,
+        grand_total=grand_total,
+        rounded_total=round(grand_total),
+        outstanding_amount=grand_total,
+        base_net_total=net_total * conversion_rate,
+        base_grand_total=grand_total * conversion_rate,
+        total_advance=sum(advance.allocated_amount for advance in advance_rows),
+        mode_of_payment=rng.choice(("Cash", "Credit Card", "Bank Transfer", "Cheque")),
+    )
+
+
+def make_gl_entries(invoice):
+    """GL entries as ERPNext's get_gl_entries would build them: receivable, income per item, taxes"""
+
+    conversion_rate = invoice.conversion_rate or 1
+    voucher = {"voucher_type": "Sales Invoice", "voucher_no": invoice.name}
+    entries = [standins._dict({
+        **voucher,
+        "account": "Debtors - BT",
+        "debit": invoice.grand_total * conversion_rate,
+        "debit_in_account_currency": invoice.grand_total,
+        "credit": 0,
+    })]
+    for item in invoice.items:
+        entries.append(standins._dict({
+            **voucher,
+            "account": item.income_account,
+            "cost_center": item.cost_center,
+            "credit": item.amount * conversion_rate,
+            "credit_in_account_currency": item.amount * conversion_rate,
+            "debit": 0,
+        }))
+    for tax in invoice.taxes:
+        entries.append(standins._dict({
+            **voucher,
+            "account": tax.account_head,
+            "credit": tax.tax_amount * conversion_rate,
+            "credit_in_account_currency": tax.tax_amount * conversion_rate,
+            "debit": 0,
+        }))
+    return entries
+
+
+def _make_tax(idx, charge_type, account_head, rate, net_total, conversion_rate, actual_amount=0):
+    tax_amount = actual_amount if charge_type == "Actual" else net_total * rate / 100
+    return standins.StandInDocument(
+        idx=idx,
+        name=f"tax-{idx}",
+        charge_type=charge_type,
+        account_head=account_head,
+        rate=rate,
+        tax_amount=tax_amount,
+        total=net_total + tax_amount,
+        base_tax_amount=tax_amount * conversion_rate,
+        base_total=(net_total + tax_amount) * conversion_rate,
+        included_in_print_rate=0,
+        included_in_paid_amount=0,
+    )
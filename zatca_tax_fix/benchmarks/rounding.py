@@ -0,0 +1,123 @@
+"""Per-call cost of `engine.money` rounding against frappe's `flt` and `rounded`,
+and a randomised parity check with `flt`:
+
+    python -m zatca_tax_fix.benchmarks.rounding --calls 200000
+
+Parity holds on the documented domain: ints and non-negative floats, with
+frappe's default (legacy) rounding at 1 to 9 decimals. Halves differ by
+design elsewhere: flt rounds negative ones towards +infinity and, at 0
+decimals, to even, while ZATCA and `engine.money` round them away from
+zero. On v15 sites whose System Settings `rounding_method` is "Banker's
+Rounding", flt rounds every exact half to even, so `engine.money` results
+differ from ERPNext's own at any precision.
+
+Without a real `frappe.utils` the timings use the stand-in copy of its
+legacy rounding and the parity check is skipped, since comparing against
+that copy proves nothing; `tests/test_rounding.py` runs it under bench.
+"""
+
+import argparse
+import random
+import time
+
+from zatca_tax_fix.benchmarks import standins
+
+
+def get_frappe_rounding():
+    try:
+        from frappe.utils import flt, rounded
+    except ImportError:
+        standins.install()
+        from frappe.utils import flt, rounded
+
+    return flt, rounded
+
+
+def is_real_frappe():
+    import frappe
+
+    return not getattr(frappe, "is_stand_in", False)
+
+
+def make_values(count, seed=0):
+    """Non-negative amounts: plain, exact decimal halves, near halves and ints"""
+
+    rng = random.Random(seed)
+    values = []
+
+    for _ in range(count):
+        roll = rng.random()
+        if roll < 0.4:
+            value = rng.uniform(0, 10 ** rng.randint(0, 9))
+        elif roll < 0.6:
+            value = rng.randint(0, 10 ** 7) / 1000 + 0.005
+        elif roll < 0.75:
+            value = (rng.randint(0, 10 ** 6) + 0.5) / 100 + rng.choice((0, 1e-9, -1e-9, 4e-9, -6e-9))
+        elif roll < 0.9:
+            value = rng.randint(0, 10 ** 6) * 0.01 * rng.choice((1.15, 0.15, 3.75, 7.333))
+        else:
+            value = rng.randint(0, 10 ** 6)
+        values.append(value)
+
+    return values
+
+
+def compare(values, flt, places=range(1, 10)):
+    """Values and places where `round_amount` differs from `flt`; empty on parity"""
+
+    from zatca_tax_fix.engine.money import round_amount
+
+    return [
+        (value, precision) for precision in places for value in values
+        if round_amount(value, precision) != flt(value, precision)
+    ]
+
+
+def time_calls(function, values, *args):
+    """Best of three mean ns per call"""
+
+    best = None
+    for _ in range(3):
+        start = time.perf_counter_ns()
+        for value in values:
+            function(value, *args)
+        elapsed = (time.perf_counter_ns() - start) / len(values)
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m zatca_tax_fix.benchmarks.rounding")
+    parser.add_argument("--calls", type=int, default=200000, help="values per measurement")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    flt, rounded = get_frappe_rounding()
+    from zatca_tax_fix.engine.money import round_amount, to_units
+
+    values = make_values(args.calls, args.seed)
+    floats = [float(value) for value in values]
+
+    suffix = "" if is_real_frappe() else " (stand-in)"
+    for name, function, arguments, inputs in (
+        ("money.to_units", to_units, (), values),
+        ("money.round_amount", round_amount, (), values),
+        (f"frappe.utils.flt{suffix}", flt, (2,), values),
+        (f"frappe.utils.rounded{suffix}", rounded, (2,), floats),
+    ):
+        print(f"{name:<36}{time_calls(function, inputs, *arguments):>9.1f} ns/call")
+
+    if not is_real_frappe():
+        print("parity with flt: skipped, frappe is not installed")
+        return
+
+    mismatches = compare(values[:20000], flt)
+    if mismatches:
+        print(f"parity with flt: {len(mismatches)} differences, e.g. {mismatches[:5]}")
+        raise SystemExit(1)
+    print("parity with flt: identical at 1 to 9 decimals")
+
+
+if __name__ == "__main__":
+    main()
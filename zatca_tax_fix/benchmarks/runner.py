@@ -0,0 +1,158 @@
+"""Latency and allocation measurements for the precision fixes.
+
+Import only after `standins.install()`.
+"""
+
+import time
+import tracemalloc
+
+import frappe
+
+from zatca_tax_fix.benchmarks import generator
+from zatca_tax_fix.events import sales_invoice as events
+from zatca_tax_fix.overrides.sales_invoice import CustomSalesInvoice
+
+
+def _save(doc):
+    events.before_validate(doc, "before_validate")
+    doc.validate()
+    events.validate(doc, "validate")
+    events.before_save(doc, "before_save")
+
+
+def _submit(doc):
+    _save(doc)
+    doc.before_submit()
+    doc.on_submit()
+    frappe.db.commit()
+
+
+def _aggressive(doc):
+    doc.fix_all_precision_issues(aggressive=True)
+    frappe.db.commit()
+
+
+def _computed(doc):
+    doc.fix_all_precision_issues()
+    return doc
+
+
+def _edit_one_row(doc):
+    item = doc.items[len(doc.items) // 2]
+    item.qty = (item.qty or 0) + 1
+    doc.fix_all_precision_issues()
+
+
+# name -> (setup(invoice) -> argument, call(argument))
+SCENARIOS = {
+    "fix_all_precision_issues": (None, lambda doc: doc.fix_all_precision_issues()),
+    "fix_all_precision_issues aggressive": (None, _aggressive),
+    "fix_item_wise_vat_calculation": (None, lambda doc: doc.fix_item_wise_vat_calculation()),
+    "fix_gl_entries_precision": (
+        lambda doc: (doc, generator.make_gl_entries(doc)),
+        lambda args: args[0].fix_gl_entries_precision(args[1]),
+    ),
+    "get_gl_entries": (None, lambda doc: doc.get_gl_entries()),
+    "fix_all_precision_issues after one edit": (_computed, _edit_one_row),
+    "fix_payment_means_code": (None, lambda doc: doc.fix_payment_means_code()),
+    "events.before_validate": (None, lambda doc: events.before_validate(doc, "before_validate")),
+    "events.validate": (None, lambda doc: events.validate(doc, "validate")),
+    "events.before_save": (None, lambda doc: events.before_save(doc, "before_save")),
+    "save lifecycle": (None, _save),
+    "submit lifecycle": (None, _submit),
+}
+
+
+def run(scenarios=None, iterations=200, allocation_iterations=20, **invoice_options):
+    """Run each scenario on fresh synthetic invoices and return one result per scenario"""
+
+    generator.register_accounts()
+    results = []
+
+    for name in scenarios or SCENARIOS:
+        setup, call = SCENARIOS[name]
+
+        def make_argument(seed):
+            doc = generator.make_invoice(
+                seed=seed, invoice_class=CustomSalesInvoice, **invoice_options)
+            return setup(doc) if setup else doc
+
+        # Warm caches (field map, VAT accounts) outside the measurement
+        call(make_argument(-1))
+
+        statements = frappe.db.statements
+        timings = []
+        for seed in range(iterations):
+            argument = make_argument(seed)
+            start = time.perf_counter_ns()
+            call(argument)
+            timings.append(time.perf_counter_ns() - start)
+        statements = frappe.db.statements - statements
+
+        peaks = []
+        tracemalloc.start()
+        try:
+            for seed in range(allocation_iterations):
+                argument = make_argument(seed)
+                tracemalloc.reset_peak()
+                baseline = tracemalloc.get_traced_memory()[0]
+                call(argument)
+                peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+        finally:
+            tracemalloc.stop()
+
+        results.append(summarize(name, timings, peaks, statements / iterations))
+
+    return results
+
+
+def summarize(name, timings, peaks, statements_per_call=0):
+    timings = sorted(timings)
+    return {
+        "scenario": name,
+        "calls": len(timings),
+        "mean_us": sum(timings) / len(timings) / 1000,
+        "p50_us": percentile(timings, 50) / 1000,
+        "p90_us": percentile(timings, 90) / 1000,
+        "p99_us": percentile(timings, 99) / 1000,
+        "max_us": timings[-1] / 1000,
+        "peak_alloc_kib": (max(peaks) / 1024) if peaks else 0,
+        "mean_alloc_kib": (sum(peaks) / len(peaks) / 1024) if peaks else 0,
+        "statements_per_call": statements_per_call,
+    }
+
+
+def percentile(sorted_values, percent):
+    """Nearest-rank percentile of an already sorted list"""
+
+    if not sorted_values:
+        return 0
+    rank = max(1, -(-percent * len(sorted_values) // 100))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def format_results(results):
+    header = (
+        f"{'scenario':<40}{'calls':>7}{'mean µs':>11}{'p50 µs':>11}{'p90 µs':>11}"
+        f"{'p99 µs':>11}{'max µs':>11}{'peak KiB':>10}{'sql/call':>10}"
+    )
+    lines = [header, "-" * len(header)]
+    for result in results:
+        lines.append(
+            f"{result['scenario']:<40}{result['calls']:>7}{result['mean_us']:>11.1f}"
+            f"{result['p50_us']:>11.1f}{result['p90_us']:>11.1f}{result['p99_us']:>11.1f}"
+            f"{result['max_us']:>11.1f}{result['peak_alloc_kib']:>10.1f}"
+            f"{result['statements_per_call']:>10.2f}"
+        )
+    return "\n".join(lines)
+
+
+def format_steps(steps):
+    header = f"{'step':<52}{'size':>9}{'count':>8}{'mean µs':>11}{'max µs':>11}"
+    lines = [header, "-" * len(header)]
+    for step in steps:
+        lines.append(
+            f"{step['step']:<52}{step['size']:>9}{step['count']:>8}"
+            f"{step['mean_us']:>11.1f}{step['max_us']:>11.1f}"
+        )
+    return "\n".join(lines)
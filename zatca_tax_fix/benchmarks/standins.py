@@ -0,0 +1,289 @@
+"""Minimal in-process stand-ins for the parts of Frappe and ERPNext the app uses.
+
+`install()` must run before any `zatca_tax_fix` module that imports frappe is
+imported. Nothing here talks to a database or Redis.
+"""
+
+import importlib.machinery
+import logging
+import math
+import os
+import sys
+import types
+import uuid
+
+
+class _dict(dict):
+    """frappe._dict: a dict with attribute access, missing keys read as None"""
+
+    __getattr__ = dict.get
+
+    def __setattr__(self, key, value):
+        self[key] = value
+
+    def __delattr__(self, key):
+        self.pop(key, None)
+
+
+class StandInDocument:
+    """Attribute bag with the Document API the engine relies on"""
+
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+        self.__dict__.setdefault('flags', _dict())
+
+    def __getattr__(self, key):
+        return None
+
+    def get(self, key, default=None):
+        return self.__dict__.get(key, default)
+
+    def set(self, key, value):
+        self.__dict__[key] = value
+
+
+class StandInSalesInvoice(StandInDocument):
+    """ERPNext SalesInvoice with every controller method reduced to a no-op"""
+
+    def validate(self):
+        pass
+
+    def before_submit(self):
+        pass
+
+    def on_submit(self):
+        self.make_gl_entries()
+
+    def make_gl_entries(self, gl_entries=None, from_repost=False):
+        """Posts the entries and, like ERPNext, returns None"""
+
+        if not gl_entries:
+            gl_entries = self.get_gl_entries()
+        self.flags.posted_gl_entries = gl_entries
+
+    def get_gl_entries(self, warehouse_account=None):
+        from zatca_tax_fix.benchmarks.generator import make_gl_entries
+
+        return make_gl_entries(self)
+
+    def on_cancel(self):
+        pass
+
+
+class _CallbackManager:
+    def __init__(self):
+        self._functions = []
+
+    def add(self, function):
+        self._functions.append(function)
+
+    def run(self):
+        functions, self._functions = self._functions, []
+        for function in functions:
+            function()
+
+    def reset(self):
+        self._functions = []
+
+
+class _Database:
+    """Counts statements instead of running them"""
+
+    def __init__(self):
+        self.statements = 0
+        self.before_commit = _CallbackManager()
+        self.after_commit = _CallbackManager()
+        self.after_rollback = _CallbackManager()
+
+    def sql(self, query, values=(), *args, **kwargs):
+        self.statements += 1
+        return []
+
+    def commit(self):
+        self.before_commit.run()
+        self.after_commit.run()
+
+    def rollback(self):
+        self.before_commit.reset()
+        self.after_commit.reset()
+        self.after_rollback.run()
+
+
+class _Cache:
+    def __init__(self):
+        self._values = {}
+
+    def get_value(self, key, generator=None):
+        if key not in self._values and generator:
+            self._values[key] = generator()
+        return self._values.get(key)
+
+    def set_value(self, key, value, *args, **kwargs):
+        self._values[key] = value
+
+    def delete_value(self, key):
+        self._values.pop(key, None)
+
+    def hget(self, name, key, generator=None):
+        values = self._values.setdefault(name, {})
+        if key not in values and generator:
+            values[key] = generator()
+        return values.get(key)
+
+    def hset(self, name, key, value):
+        self._values.setdefault(name, {})[key] = value
+
+    def hdel(self, name, key):
+        self._values.get(name, {}).pop(key, None)
+
+
+class _Meta:
+    def __init__(self, fieldnames):
+        self._fieldnames = frozenset(fieldnames)
+
+    def has_field(self, fieldname):
+        return fieldname in self._fieldnames
+
+
+# Accounts returned by frappe.get_all("Account"); filled by the generator
+ACCOUNTS = []
+
+# Modes of Payment returned by frappe.get_all("Mode of Payment")
+MODES_OF_PAYMENT = [
+    _dict(name="Cash", type="Cash"),
+    _dict(name="Credit Card", type="Bank"),
+    _dict(name="Bank Transfer", type="Bank"),
+    _dict(name="Cheque", type="Bank"),
+    _dict(name="Mada", type="Bank"),
+]
+
+
+def flt(s, precision=None, rounding_method=None):
+    """frappe.utils.flt with the default legacy rounding"""
+
+    try:
+        num = float(s or 0)
+    except (TypeError, ValueError):
+        num = 0.0
+
+    if precision is not None:
+        num = rounded(num, precision)
+    return num
+
+
+def rounded(num, precision=0, rounding_method=None):
+    precision = int(precision)
+    multiplier = 10 ** precision
+    num = round(num * multiplier if precision else num, 8)
+
+    floor_num = math.floor(num)
+    decimal_part = num - floor_num
+
+    if not precision and decimal_part == 0.5:
+        num = floor_num if (floor_num % 2 == 0) else floor_num + 1
+    elif decimal_part == 0.5:
+        num = floor_num + 1
+    else:
+        num = round(num)
+
+    return (num / multiplier) if precision else num
+
+
+def install():
+    """Register the stand-ins as `frappe`, `frappe.utils` and the ERPNext controller.
+
+    Installing again returns the registered module, which already imported
+    app modules keep referring to.
+    """
+
+    installed = sys.modules.get("frappe")
+    if getattr(installed, "is_stand_in", False):
+        return installed
+
+    logger = logging.getLogger("zatca_tax_fix.benchmarks")
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+
+    frappe = types.ModuleType("frappe")
+    # So importlib.util.find_spec("frappe") finds the stand-in once installed
+    frappe.__spec__ = importlib.machinery.ModuleSpec("frappe", None)
+    frappe.is_stand_in = True
+    frappe._dict = _dict
+    frappe.local = _dict(site="benchmark.local")
+    frappe.flags = _dict()
+    frappe.conf = _dict()
+    frappe.session = _dict(user="Administrator")
+    frappe.db = _Database()
+
+    cache = _Cache()
+
+    frappe.logger = lambda *args, **kwargs: logger
+    frappe.log_error = lambda *args, **kwargs: None
+    frappe.cache = lambda: cache
+    frappe.get_meta = _get_meta
+    frappe.get_all = _get_all
+    frappe.generate_hash = lambda *args, length=10, **kwargs: uuid.uuid4().hex[:length]
+    frappe.whitelist = lambda *args, **kwargs: (lambda function: function)
+    frappe.only_for = lambda *args, **kwargs: None
+    frappe.get_site_path = lambda *parts: os.path.join(".", *parts)
+
+    utils = types.ModuleType("frappe.utils")
+    utils.flt = flt
+    utils.rounded = rounded
+    utils.cint = lambda s: int(flt(s))
+    utils.cstr = lambda s: "" if s is None else str(s)
+    utils.now = lambda: "2026-01-01 00:00:00.000000"
+    frappe.utils = utils
+
+    model = types.ModuleType("frappe.model")
+    document = types.ModuleType("frappe.model.document")
+    document.Document = StandInDocument
+    model.document = document
+    frappe.model = model
+
+    controller = types.ModuleType("erpnext.accounts.doctype.sales_invoice.sales_invoice")
+    controller.SalesInvoice = StandInSalesInvoice
+
+    general_ledger = types.ModuleType("erpnext.accounts.general_ledger")
+    general_ledger.get_merge_properties = get_merge_properties
+
+    # No accounting dimensions on the stand-in site
+    dimensions = types.ModuleType("erpnext.accounts.doctype.accounting_dimension.accounting_dimension")
+    dimensions.get_accounting_dimensions = lambda *args, **kwargs: []
+
+    sys.modules["frappe"] = frappe
+    sys.modules["frappe.utils"] = utils
+    sys.modules["frappe.model"] = model
+    sys.modules["frappe.model.document"] = document
+    for name in (
+        "erpnext", "erpnext.accounts", "erpnext.accounts.doctype",
+        "erpnext.accounts.doctype.sales_invoice", "erpnext.accounts.doctype.accounting_dimension"
+    ):
+        sys.modules[name] = types.ModuleType(name)
+    for module in (controller, general_ledger, dimensions):
+        sys.modules[module.__name__] = module
+
+    return frappe
+
+
+def get_merge_properties(dimensions=None):
+    """Copy of ERPNext's `general_ledger.get_merge_properties`"""
+
+    merge_properties = [
+        "account", "cost_center", "party", "party_type", "voucher_detail_no", "against_voucher",
+        "against_voucher_type", "project", "finance_book", "voucher_no",
+    ]
+    if dimensions:
+        merge_properties.extend(dimensions)
+    return merge_properties
+
+
+def _get_all(doctype, *args, **kwargs):
+    return list({"Account": ACCOUNTS, "Mode of Payment": MODES_OF_PAYMENT}.get(doctype, ()))
+
+
+def _get_meta(doctype, *args, **kwargs):
+    # Every optional field the engine knows about exists on the stand-in doctypes
+    from zatca_tax_fix.engine.fields import OPTIONAL_FIELDS
+
+    return _Meta(OPTIONAL_FIELDS.get(doctype, ()))
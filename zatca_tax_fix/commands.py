@@ -0,0 +1,108 @@
+import click
+import frappe
+from frappe.commands import get_site, pass_context
+
+
+@click.command("zatca-repair-invoices")
+@click.option("--company", help="Only invoices of this company")
+@click.option("--from-date", help="Only invoices posted on or after this date (YYYY-MM-DD)")
+@click.option("--to-date", help="Only invoices posted on or before this date (YYYY-MM-DD)")
+@click.option("--chunk-size", type=int, default=500, show_default=True, help="Invoices per chunk")
+@click.option("--restart", is_flag=True, help="Ignore the stored checkpoint and start over")
+@click.option("--enqueue", is_flag=True, help="Run in a background worker on the long queue")
+@click.option(
+    "--processes", type=int, default=1, show_default=True,
+    help="Repair company and period partitions on this many processes")
+@click.option(
+    "--period-months", type=int, default=1, show_default=True,
+    help="Months per partition when running on several processes")
+@pass_context
+def repair_invoices(context, company=None, from_date=None, to_date=None,
+                    chunk_size=500, restart=False, enqueue=False, processes=1, period_months=1):
+    """Recompute the stored totals of submitted Sales Invoices"""
+
+    from zatca_tax_fix.repair import invoices, parallel
+
+    frappe.init(site=get_site(context))
+    frappe.connect()
+
+    try:
+        if enqueue:
+            job = invoices.enqueue_repair_job(company, from_date, to_date, chunk_size, restart)
+            click.echo(f"Enqueued {job}")
+            return
+
+        if processes > 1:
+            def on_progress(result, totals):
+                status = f"failed: {result['error']}" if result["error"] else f"repaired {result['repaired']}"
+                click.echo(
+                    f"[{totals['done']}/{totals['partitions']}] {result['company']} "
+                    f"{result['from_date']}..{result['to_date']}: {status}"
+                )
+
+            totals = parallel.repair_in_parallel(
+                company, from_date, to_date, processes, period_months, chunk_size, restart, on_progress)
+            click.echo(
+                f"Scanned {totals['scanned']} invoices, repaired {totals['repaired']}, "
+                f"{len(totals['failed'])} of {totals['partitions']} partitions failed"
+            )
+            return
+
+        checkpoint = invoices.repair_invoices(company, from_date, to_date, chunk_size, restart)
+        click.echo(
+            f"Scanned {checkpoint['scanned']} invoices, repaired {checkpoint['repaired']}"
+        )
+    finally:
+        frappe.destroy()
+
+
+@click.command("zatca-backfill-vat-reconciliation")
+@click.option("--chunk-size", type=int, default=500, show_default=True, help="Invoices per chunk")
+@click.option("--restart", is_flag=True, help="Ignore the stored checkpoint and start over")
+@pass_context
+def backfill_vat_reconciliation(context, chunk_size=500, restart=False):
+    """Fill the ZATCA VAT Reconciliation summary for submitted Sales Invoices"""
+
+    from zatca_tax_fix.zatca_tax_fix.doctype.zatca_vat_reconciliation.zatca_vat_reconciliation import (
+        backfill,
+    )
+
+    frappe.init(site=get_site(context))
+    frappe.connect()
+
+    try:
+        checkpoint = backfill(chunk_size, restart)
+        click.echo(f"Summarized {checkpoint['scanned']} invoices")
+    finally:
+        frappe.destroy()
+
+
+@click.command("zatca-repost-gl-precision")
+@click.option("--company", help="Only invoices of this company")
+@click.option("--from-date", help="Only invoices posted on or after this date (YYYY-MM-DD)")
+@click.option("--to-date", help="Only invoices posted on or before this date (YYYY-MM-DD)")
+@click.option("--chunk-size", type=int, default=500, show_default=True, help="Invoices per chunk")
+@click.option("--restart", is_flag=True, help="Ignore the stored checkpoint and start over")
+@pass_context
+def repost_gl_precision(context, company=None, from_date=None, to_date=None,
+                        chunk_size=500, restart=False):
+    """Post round-off entries for unbalanced GL entries of submitted Sales Invoices"""
+
+    from zatca_tax_fix.repair.gl_entries import repost_gl_precision
+
+    frappe.init(site=get_site(context))
+    frappe.connect()
+
+    try:
+        checkpoint = repost_gl_precision(company, from_date, to_date, chunk_size, restart)
+        click.echo(
+            f"Scanned {checkpoint['scanned']} invoices and {checkpoint['entries']} GL entries, "
+            f"balanced {checkpoint['repaired']} vouchers"
+        )
+        click.echo(
+            f"This run: {checkpoint['seconds']:.1f}s, {checkpoint['invoices_per_second']} invoices/s")
+    finally:
+        frappe.destroy()
+
+
+commands = [repair_invoices, backfill_vat_reconciliation, repost_gl_precision]
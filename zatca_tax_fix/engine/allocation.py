@@ -0,0 +1,46 @@
+import heapq
+
+
+def distribute(total, weights):
+    """Split an integer `total` over `weights` with the largest-remainder method.
+
+    Every share gets the floor of its proportional quota and the units left
+    over go, one each, to the shares with the largest remainders (ties go to
+    the larger weight, then the earlier position). Shares always add up to
+    `total` exactly. Runs in O(n log k) for n weights and k leftover units.
+
+    Weights must not be negative; callers with signed amounts pass their
+    magnitudes. When they add up to zero the total is split evenly.
+    """
+
+    count = len(weights)
+    if not count:
+        return []
+
+    if any(weight < 0 for weight in weights):
+        raise ValueError("distribute() weights must not be negative")
+
+    weight_sum = sum(weights)
+    if not weight_sum:
+        weights = [1] * count
+        weight_sum = count
+
+    magnitude = abs(total)
+    shares = []
+    remainders = []
+
+    for weight in weights:
+        share, remainder = divmod(magnitude * weight, weight_sum)
+        shares.append(share)
+        remainders.append(remainder)
+
+    left = magnitude - sum(shares)
+    if left:
+        for index in heapq.nlargest(
+            left, range(count), key=lambda i: (remainders[i], weights[i], -i)
+        ):
+            shares[index] += 1
+
+    if total < 0:
+        return [-share for share in shares]
+    return shares
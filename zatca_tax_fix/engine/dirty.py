@@ -0,0 +1,110 @@
+"""Per-row state of the last items computation of an invoice.
+
+Kept in the document's flags between lifecycle passes, it lets a pass
+recompute only the item rows whose values differ from what the previous
+pass left on them, and update net totals and item-wise VAT by the change of
+those rows.
+"""
+
+from operator import attrgetter
+
+from zatca_tax_fix.engine import vectorized
+from zatca_tax_fix.engine.money import convert, from_units, percent_of
+
+
+class ItemCache:
+    __slots__ = (
+        'amounts', 'base_net_total', 'dirty', 'exchange_rate', 'fields', 'getter',
+        'item_wise_vat', 'net_total', 'previous', 'rows', 'snapshots', 'vat_rate'
+    )
+
+    def __init__(self, items, amounts, net_total, base_net_total, exchange_rate, fields):
+        self.rows = list(items)
+        self.fields = fields
+        self.exchange_rate = exchange_rate
+        self.getter = attrgetter(*get_tracked_fields(fields))
+        self.snapshots = None
+        self.amounts = amounts.tolist() if vectorized.is_array(amounts) else list(amounts)
+        self.net_total = net_total
+        self.base_net_total = base_net_total
+
+        # Rows recomputed by the current pass and their amounts before it;
+        # None when the pass wrote every row
+        self.dirty = None
+        self.previous = None
+
+        # Item-wise VAT of the rows at this rate, set by the reconciliation
+        self.vat_rate = None
+        self.item_wise_vat = None
+
+    def get_dirty(self, items, exchange_rate, fields):
+        """Indexes of the rows changed since `remember`, or None if all must be recomputed"""
+
+        if (
+            self.snapshots is None
+            or fields is not self.fields
+            or exchange_rate != self.exchange_rate
+            or len(items) != len(self.rows)
+        ):
+            return None
+
+        getter, rows, snapshots = self.getter, self.rows, self.snapshots
+        return [
+            index for index, item in enumerate(items)
+            if item is not rows[index] or getter(item) != snapshots[index]
+        ]
+
+    def update(self, dirty, amounts):
+        """Apply the recomputed amounts of the dirty rows to the totals"""
+
+        self.dirty = dirty
+        self.previous = [self.amounts[index] for index in dirty]
+
+        for index, previous, amount in zip(dirty, self.previous, amounts, strict=True):
+            if amount == previous:
+                continue
+
+            self.amounts[index] = amount
+            self.net_total += amount - previous
+            if self.exchange_rate:
+                self.base_net_total += (
+                    convert(amount, self.exchange_rate) - convert(previous, self.exchange_rate))
+
+    def get_item_wise_vat(self, items, vat_rate, store_on_items):
+        """Item-wise VAT updated by the dirty rows, or None if it must be recomputed"""
+
+        if self.dirty is None or vat_rate != self.vat_rate:
+            return None
+
+        item_wise_vat = self.item_wise_vat
+        for index, previous in zip(self.dirty, self.previous, strict=True):
+            amount = self.amounts[index]
+            item_vat = percent_of(amount, vat_rate)
+            item_wise_vat += item_vat - percent_of(previous, vat_rate)
+
+            # Stored on the item for ZATCA reference
+            if store_on_items and amount:
+                items[index].tax_amount = from_units(item_vat)
+
+        return item_wise_vat
+
+    def remember(self, items):
+        """Take the snapshots after the pass has written its values to the rows"""
+
+        if self.dirty is None:
+            self.snapshots = [self.getter(item) for item in items]
+        else:
+            for index in self.dirty:
+                self.snapshots[index] = self.getter(items[index])
+
+
+def get_tracked_fields(fields):
+    """Item fields the engine reads or writes"""
+
+    tracked = ['rate', 'qty', 'amount']
+    tracked.extend(
+        field for field in ('base_rate', 'base_amount', 'base_net_rate', 'base_net_amount', 'tax_amount')
+        if field in fields.item)
+    tracked.extend(field for field, _ in fields.item_resets if field not in tracked)
+
+    return tracked
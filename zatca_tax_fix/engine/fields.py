@@ -0,0 +1,85 @@
+import frappe
+
+VERSION_KEY = "zatca_field_map_version"
+
+# Fields the engine writes only when the doctype has them; several are custom
+# fields added by ZATCA apps rather than standard ERPNext fields
+OPTIONAL_FIELDS = {
+    "Sales Invoice": (
+        'rounded_total', 'base_rounded_total', 'item_wise_vat_total', 'payment_means_code',
+        'ksa_payment_means_code', 'base_discount_amount', 'base_write_off_amount',
+        'base_paid_amount', 'base_change_amount', 'base_total_advance', 'base_allocated_amount'
+    ),
+    "Sales Invoice Item": (
+        'base_rate', 'base_amount', 'base_net_rate', 'base_net_amount',
+        'item_tax_template', 'tax_inclusive_rate', 'tax_amount'
+    ),
+    "Sales Taxes and Charges": (
+        'base_tax_amount', 'base_total', 'included_in_print_rate', 'included_in_paid_amount'
+    ),
+}
+
+# Values that keep taxes at document level, never included in the item rate
+ITEM_RESETS = (('item_tax_template', None), ('tax_inclusive_rate', 0), ('tax_amount', 0))
+ACTUAL_TAX_RESETS = (('included_in_print_rate', 0), ('included_in_paid_amount', 0))
+PAYMENT_MEANS_FIELDS = ('payment_means_code', 'ksa_payment_means_code')
+
+_field_maps = {}
+
+
+class FieldMap:
+    """Which optional fields exist on the invoice doctypes, built from meta"""
+
+    __slots__ = (
+        'actual_tax_resets', 'invoice', 'item', 'item_resets', 'payment_means_field', 'present',
+        'tax'
+    )
+
+    def __init__(self, present):
+        self.present = present
+
+        self.invoice = present["Sales Invoice"]
+        self.item = present["Sales Invoice Item"]
+        self.tax = present["Sales Taxes and Charges"]
+
+        self.item_resets = tuple(
+            (field, value) for field, value in ITEM_RESETS if field in self.item)
+        self.actual_tax_resets = tuple(
+            (field, value) for field, value in ACTUAL_TAX_RESETS if field in self.tax)
+
+        # Custom field holding the UNTDID 4461 code, named differently by ZATCA apps
+        self.payment_means_field = next(
+            (field for field in PAYMENT_MEANS_FIELDS if field in self.invoice), None)
+
+    def has(self, doctype, fieldname):
+        return fieldname in self.present.get(doctype, ())
+
+
+def get_field_map():
+    """Field map of the current site, built once per worker and field map version"""
+
+    version = frappe.cache().get_value(VERSION_KEY)
+    key = (frappe.local.site, version)
+
+    field_map = _field_maps.get(key)
+    if field_map is None:
+        for stale_key in [k for k in _field_maps if k[0] == key[0]]:
+            del _field_maps[stale_key]
+        field_map = _field_maps[key] = _build()
+
+    return field_map
+
+
+def clear_field_map(*args, **kwargs):
+    """Custom Field / DocType hook and after_migrate: rebuild the map in every worker"""
+    frappe.cache().set_value(VERSION_KEY, frappe.generate_hash(length=10))
+
+
+def _build():
+    present = {}
+
+    for doctype, optional_fields in OPTIONAL_FIELDS.items():
+        meta = frappe.get_meta(doctype)
+        present[doctype] = frozenset(field for field in optional_fields if meta.has_field(field))
+
+    return FieldMap(present)
@@ -0,0 +1,145 @@
+import frappe
+
+from zatca_tax_fix.engine import log
+from zatca_tax_fix.engine.allocation import distribute
+from zatca_tax_fix.engine.money import from_units, round_amount, to_units
+
+# Similar entries are merged, as ERPNext's merge_similar_entries would, when
+# `"zatca_tax_fix_merge_gl_entries": 1` is set in site_config.json
+MERGE_KEY = "zatca_tax_fix_merge_gl_entries"
+
+# (debit, credit) columns summed by a merge, then netted against each other
+AMOUNT_PAIRS = (
+    ('debit', 'credit'),
+    ('debit_in_account_currency', 'credit_in_account_currency'),
+    ('debit_in_transaction_currency', 'credit_in_transaction_currency'),
+)
+
+
+def fix_gl_entries_precision(gl_entries, voucher_no=None, merge=None):
+    """Round GL entries to halalas and spread any imbalance over one side.
+
+    With `merge` (by default the site config), similar entries are first
+    merged by `merge_gl_entries`, in place, so each is rounded once. The
+    difference between debits and credits is distributed with the
+    largest-remainder method over the entries on the side that has to grow,
+    weighted by the magnitude of their amounts. Returns the difference in
+    halalas.
+    """
+
+    if merge is None:
+        merge = frappe.conf.get(MERGE_KEY)
+    if merge:
+        gl_entries[:] = merge_gl_entries(gl_entries)
+
+    total_debit = total_credit = 0
+    debit_entries = []
+    credit_entries = []
+
+    for entry in gl_entries:
+        debit = to_units(entry.get('debit'))
+        credit = to_units(entry.get('credit'))
+
+        if debit:
+            entry['debit'] = from_units(debit)
+            total_debit += debit
+            debit_entries.append((entry, debit))
+
+        if credit:
+            entry['credit'] = from_units(credit)
+            total_credit += credit
+            credit_entries.append((entry, credit))
+
+        for field in ('debit_in_account_currency', 'credit_in_account_currency'):
+            if entry.get(field):
+                entry[field] = round_amount(entry[field])
+
+    difference = total_debit - total_credit
+    if not difference:
+        return 0
+
+    if difference > 0:
+        # More debit: grow the credits, or shrink the debits if there are none
+        side, entries, adjustment = 'credit', credit_entries, difference
+        if not entries:
+            side, entries, adjustment = 'debit', debit_entries, -difference
+    else:
+        side, entries, adjustment = 'debit', debit_entries, -difference
+        if not entries:
+            side, entries, adjustment = 'credit', credit_entries, difference
+
+    # Entries are still signed on credit notes: ERPNext only flips negative
+    # amounts to the other side when it posts them
+    account_field = f'{side}_in_account_currency'
+    shares = distribute(adjustment, [abs(amount) for _, amount in entries])
+
+    for (entry, amount), share in zip(entries, shares, strict=True):
+        if not share:
+            continue
+
+        # Only entries booked in company currency carry the same amount
+        if to_units(entry.get(account_field)) == amount:
+            entry[account_field] = from_units(amount + share)
+        entry[side] = from_units(amount + share)
+
+    log.adjustment("gl_adjusted", voucher_no, diff=from_units(difference))
+    return difference
+
+
+def merge_gl_entries(gl_entries):
+    """Entries with the same merge properties folded into the first of them.
+
+    The properties are ERPNext's own, with the site's accounting dimensions.
+    Amounts are summed before any rounding, so a hundred items booked to one
+    income account give one rounded row instead of a hundred rounding errors;
+    a merged row that gets both a debit and a credit keeps only their net, and
+    rows that net to zero are dropped.
+
+    Entries with a party are kept as they are. By now ERPNext has added the
+    POS payment and write-off rows, which credit the receivable the invoice
+    debits; netting them would drop the invoice from the Payment Ledger.
+    """
+
+    fields = get_merge_fields()
+    result = []
+    merged = {}
+
+    for entry in gl_entries:
+        if entry.get('party'):
+            result.append(entry)
+            continue
+
+        key = tuple(entry.get(field) for field in fields)
+        first = merged.get(key)
+        if first is None:
+            merged[key] = entry
+            result.append(entry)
+            continue
+
+        for pair in AMOUNT_PAIRS:
+            for field in pair:
+                if entry.get(field):
+                    first[field] = (first.get(field) or 0) + entry[field]
+
+    for entry in merged.values():
+        for debit_field, credit_field in AMOUNT_PAIRS:
+            debit, credit = entry.get(debit_field), entry.get(credit_field)
+            if debit and credit:
+                net = debit - credit
+                entry[debit_field] = net if net > 0 else 0
+                entry[credit_field] = -net if net < 0 else 0
+
+    return [
+        entry for entry in result
+        if entry.get('party') or to_units(entry.get('debit')) or to_units(entry.get('credit'))
+    ]
+
+
+def get_merge_fields():
+    from erpnext.accounts.doctype.accounting_dimension.accounting_dimension import (
+        get_accounting_dimensions,
+    )
+    from erpnext.accounts.general_ledger import get_merge_properties
+
+    return tuple(get_merge_properties(get_accounting_dimensions()))
+
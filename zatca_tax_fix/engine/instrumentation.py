@@ -0,0 +1,202 @@
+"""Per-step timings and path counters for the precision fixes, aggregated per worker.
+
+Timings are enabled with `"zatca_tax_fix_timings": 1` in site_config.json;
+when disabled every timing helper here returns after a single config lookup.
+Counters of which path the engine took are always kept.
+"""
+
+import functools
+import json
+import os
+import time
+from contextlib import nullcontext
+
+import frappe
+
+CONFIG_KEY = "zatca_tax_fix_timings"
+
+# Upper bounds in microseconds of the histogram buckets; the last is open
+BUCKET_BOUNDS_US = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000)
+
+# Invoice size buckets by number of items
+SIZE_BUCKETS = ((10, "1-10"), (50, "11-50"), (200, "51-200"), (500, "201-500"))
+LARGEST_SIZE_BUCKET = "501+"
+
+_histograms = {}
+_counters = {}
+_NOOP_SPAN = nullcontext()
+
+
+class Histogram:
+    __slots__ = ('buckets', 'count', 'max_ns', 'total_ns')
+
+    def __init__(self):
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        self.buckets = [0] * (len(BUCKET_BOUNDS_US) + 1)
+
+    def add(self, elapsed_ns):
+        self.count += 1
+        self.total_ns += elapsed_ns
+        if elapsed_ns > self.max_ns:
+            self.max_ns = elapsed_ns
+
+        elapsed_us = elapsed_ns / 1000
+        for index, bound in enumerate(BUCKET_BOUNDS_US):
+            if elapsed_us <= bound:
+                self.buckets[index] += 1
+                return
+        self.buckets[-1] += 1
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "mean_us": round(self.total_ns / self.count / 1000, 1) if self.count else 0,
+            "max_us": round(self.max_ns / 1000, 1),
+            "buckets_us": {
+                **{f"<={bound}": count for bound, count in zip(BUCKET_BOUNDS_US, self.buckets, strict=False)},
+                f">{BUCKET_BOUNDS_US[-1]}": self.buckets[-1],
+            },
+        }
+
+
+class _Laps:
+    """Records the time since the previous lap under `<prefix>.<step>`"""
+
+    __slots__ = ('last', 'prefix', 'size')
+
+    def __init__(self, prefix, size):
+        self.prefix = prefix
+        self.size = size
+        self.last = time.perf_counter_ns()
+
+    def lap(self, step):
+        now = time.perf_counter_ns()
+        record(f"{self.prefix}.{step}", self.size, now - self.last)
+        self.last = now
+
+
+class _NoLaps:
+    __slots__ = ()
+
+    def lap(self, step):
+        pass
+
+
+_NO_LAPS = _NoLaps()
+
+
+class _Span:
+    __slots__ = ('name', 'size', 'start')
+
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        record(self.name, self.size, time.perf_counter_ns() - self.start)
+
+
+def is_enabled():
+    return bool(frappe.conf.get(CONFIG_KEY))
+
+
+def size_bucket(doc):
+    items = len(doc.get("items") or ()) if doc is not None else 0
+    for bound, label in SIZE_BUCKETS:
+        if items <= bound:
+            return label
+    return LARGEST_SIZE_BUCKET
+
+
+def record(name, size, elapsed_ns):
+    histogram = _histograms.get((name, size))
+    if histogram is None:
+        histogram = _histograms[(name, size)] = Histogram()
+    histogram.add(elapsed_ns)
+
+
+def count(name):
+    """Count one occurrence of `name`, e.g. the path an invoice took"""
+    _counters[name] = _counters.get(name, 0) + 1
+
+
+def span(name, doc=None):
+    """Context manager timing a block under `name` for the invoice's size bucket"""
+    if not is_enabled():
+        return _NOOP_SPAN
+    return _Span(name, size_bucket(doc))
+
+
+def laps(prefix, doc=None):
+    """Lap timer for consecutive steps of one function"""
+    if not is_enabled():
+        return _NO_LAPS
+    return _Laps(prefix, size_bucket(doc))
+
+
+def timed(name):
+    """Decorator timing a hook or method whose first argument is the invoice"""
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(doc, *args, **kwargs):
+            if not is_enabled():
+                return function(doc, *args, **kwargs)
+
+            with _Span(name, size_bucket(doc)):
+                return function(doc, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def get_stats():
+    """Histograms of this worker keyed by step and invoice size bucket, and its counters"""
+
+    return {
+        "pid": os.getpid(),
+        "enabled": is_enabled(),
+        "counters": dict(sorted(_counters.items())),
+        "steps": [
+            {"step": name, "size": size, **histogram.as_dict()}
+            for (name, size), histogram in sorted(_histograms.items())
+        ],
+    }
+
+
+@frappe.whitelist()
+def get_timings():
+    """Timings collected by the worker serving this request"""
+    frappe.only_for("System Manager")
+    return get_stats()
+
+
+def dump(path=None):
+    """Write this worker's timings as JSON to `path`, by default in the site's logs folder"""
+
+    path = path or frappe.get_site_path("logs", f"zatca_timings_{os.getpid()}.json")
+    with open(path, "w") as f:
+        json.dump(get_stats(), f, indent=1)
+
+    return path
+
+
+@frappe.whitelist()
+def dump_timings():
+    """Dump the timings of the worker serving this request to the site's logs folder"""
+    frappe.only_for("System Manager")
+    return dump()
+
+
+@frappe.whitelist()
+def reset_timings():
+    frappe.only_for("System Manager")
+    _histograms.clear()
+    _counters.clear()
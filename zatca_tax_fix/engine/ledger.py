@@ -0,0 +1,34 @@
+"""Which stages of the precision fixes have run on a document.
+
+Both the overridden controller and `doc_events` call the engine, often for
+the same stage of the same document, and `make_gl_entries` repeats the
+aggressive fix `on_submit` has just done. Each document carries, in its
+flags, the fingerprint its invoice had when a stage last completed; calling
+the stage again on an unchanged invoice is suppressed and counted under
+`suppressed.<stage>` in `instrumentation`.
+"""
+
+from zatca_tax_fix.engine.instrumentation import count
+
+# Ledger key shared by every aggressive stage: the write-back happens once
+# per fingerprint, whichever stage gets there first
+AGGRESSIVE = "aggressive"
+
+
+def already_applied(doc, stage, fingerprint):
+    """Whether `stage` has completed on `doc` at this fingerprint; counts the suppressed call"""
+
+    ledger = doc.flags.zatca_ledger
+    if ledger is None or ledger.get(stage) != fingerprint:
+        return False
+
+    count(f"suppressed.{stage}")
+    return True
+
+
+def record(doc, stage, fingerprint):
+    """Note that `stage` has completed on `doc` with the invoice at `fingerprint`"""
+
+    if doc.flags.zatca_ledger is None:
+        doc.flags.zatca_ledger = {}
+    doc.flags.zatca_ledger[stage] = fingerprint
@@ -0,0 +1,87 @@
+"""Structured logging for the precision fixes.
+
+Records are single lines of key=value pairs written to the app's own log,
+`logs/zatca_tax_fix.log`. Nothing is formatted unless the level is enabled.
+
+Routine "applied" records can be sampled with
+`"zatca_tax_fix_log_sample_rate": 0.01` in site_config.json; adjustments,
+where a fix changed an amount, and errors are always written.
+"""
+
+import logging
+import random
+
+import frappe
+
+LOGGER_NAME = "zatca_tax_fix"
+SAMPLE_RATE_KEY = "zatca_tax_fix_log_sample_rate"
+
+# Loggers per site; frappe.logger builds a new lookup key on every call
+_loggers = {}
+
+
+def get_logger():
+    site = getattr(frappe.local, "site", None)
+    logger = _loggers.get(site)
+    if logger is None:
+        logger = _loggers[site] = frappe.logger(LOGGER_NAME)
+    return logger
+
+
+def applied(doc, step):
+    """A fix ran; sampled, since it is logged on every pass"""
+
+    logger = get_logger()
+    if not logger.isEnabledFor(logging.INFO) or not _sampled():
+        return
+
+    logger.info(format_record(
+        "applied",
+        invoice=doc.name,
+        step=step,
+        net=doc.net_total,
+        tax=doc.total_taxes_and_charges,
+        grand=doc.grand_total,
+    ))
+
+
+def adjustment(event, invoice, **fields):
+    """A fix changed an amount; never sampled"""
+
+    logger = get_logger()
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(format_record(event, invoice=invoice, **fields))
+
+
+def progress(event, **fields):
+    """Progress of a batch job; never sampled"""
+
+    logger = get_logger()
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(format_record(event, **fields))
+
+
+def error(step, invoice, exception):
+    logger = get_logger()
+    if logger.isEnabledFor(logging.ERROR):
+        logger.error(format_record("error", invoice=invoice, step=step, error=exception))
+
+
+def format_record(event, **fields):
+    parts = [f"event={event}"]
+    for key, value in fields.items():
+        value = str(value)
+        if not value or any(c.isspace() or c in '="' for c in value):
+            value = '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+        parts.append(f"{key}={value}")
+
+    return " ".join(parts)
+
+
+def _sampled():
+    rate = frappe.conf.get(SAMPLE_RATE_KEY)
+    if rate is None:
+        return True
+
+    rate = float(rate)
+    return rate >= 1 or (rate > 0 and random.random() < rate)
@@ -0,0 +1,118 @@
+"""Fixed-point money arithmetic in integer minor units (halalas).
+
+Amounts are converted to integers once when they are read from a document,
+every sum, percentage and currency conversion is done on integers with an
+explicit rounding mode, and the results are converted back once on write.
+"""
+
+import math
+
+ROUND_HALF_UP = "Half Up"
+ROUND_HALF_EVEN = "Half Even"
+
+# ZATCA expects commercial rounding: halves go away from zero
+DEFAULT_ROUNDING = ROUND_HALF_UP
+
+CURRENCY_PLACES = 2
+QTY_PLACES = 3
+RATE_PLACES = 6
+EXCHANGE_PLACES = 9
+
+_SCALE = tuple(10 ** places for places in range(10))
+
+CURRENCY_SCALE = _SCALE[CURRENCY_PLACES]
+QTY_SCALE = _SCALE[QTY_PLACES]
+EXCHANGE_SCALE = _SCALE[EXCHANGE_PLACES]
+PERCENT_SCALE = 100 * _SCALE[RATE_PLACES]
+
+# Fractions of a unit outside this band round the same with or without the
+# 8 digit guard, which moves a value by at most 5e-9
+_BELOW_HALF = 0.5 - 1e-8
+_ABOVE_HALF = 0.5 + 1e-8
+
+
+def to_units(value, places=CURRENCY_PLACES, rounding=DEFAULT_ROUNDING):
+    """Convert an amount to an integer number of 10**-places units"""
+
+    if not value:
+        return 0
+
+    if isinstance(value, int):
+        return value * _SCALE[places]
+
+    scaled = float(value) * _SCALE[places]
+    magnitude = -scaled if scaled < 0 else scaled
+    units = int(magnitude)
+    fraction = magnitude - units
+
+    if fraction > _ABOVE_HALF:
+        units += 1
+    elif fraction >= _BELOW_HALF:
+        # Near a half, apply the same 8 digit guard as frappe's flt against
+        # binary representation error; further away it cannot change the result
+        units = _round_guarded(magnitude, rounding)
+
+    return -units if scaled < 0 else units
+
+
+def round_amount(value, places=CURRENCY_PLACES, rounding=DEFAULT_ROUNDING):
+    """`value` rounded to `places` decimals as a float, like flt(value, places)"""
+    return from_units(to_units(value, places, rounding), places)
+
+
+def _round_guarded(magnitude, rounding):
+    magnitude = round(magnitude, 8)
+    units = math.floor(magnitude)
+    fraction = magnitude - units
+
+    if fraction > 0.5 or (fraction == 0.5 and (rounding == ROUND_HALF_UP or units & 1)):
+        units += 1
+
+    return units
+
+
+def from_units(units, places=CURRENCY_PLACES):
+    """Convert integer units back to the float stored on the document"""
+    return units / _SCALE[places]
+
+
+def round_div(numerator, denominator, rounding=DEFAULT_ROUNDING):
+    """Integer division of `numerator` by a positive `denominator`, rounded"""
+
+    quotient, remainder = divmod(abs(numerator), denominator)
+    twice = 2 * remainder
+
+    if twice > denominator or (
+        twice == denominator and (rounding == ROUND_HALF_UP or quotient & 1)
+    ):
+        quotient += 1
+
+    return -quotient if numerator < 0 else quotient
+
+
+def rate_units(rate):
+    """Tax rate percentage as integer units of RATE_PLACES"""
+    return to_units(rate, RATE_PLACES)
+
+
+def percent_of(units, rate, rounding=DEFAULT_ROUNDING):
+    """`rate` percent (in rate units) of an amount in minor units"""
+    return round_div(units * rate, PERCENT_SCALE, rounding)
+
+
+def multiply(rate, qty, rounding=DEFAULT_ROUNDING):
+    """Line amount in minor units for a rate in minor units and qty in qty units"""
+    return round_div(rate * qty, QTY_SCALE, rounding)
+
+
+def convert(units, exchange_rate, rounding=DEFAULT_ROUNDING):
+    """Convert minor units with an exchange rate given in EXCHANGE_PLACES units"""
+
+    if exchange_rate == EXCHANGE_SCALE:
+        return units
+    return round_div(units * exchange_rate, EXCHANGE_SCALE, rounding)
+
+
+def round_whole(units, rounding=DEFAULT_ROUNDING):
+    """Round minor units to a whole currency unit, e.g. for rounded_total"""
+    return round_div(units, CURRENCY_SCALE, rounding) * CURRENCY_SCALE
@@ -0,0 +1,81 @@
+import frappe
+
+CACHE_KEY = "zatca_payment_means_codes"
+
+# UNTDID 4461 codes. Sites can map Modes of Payment to codes directly with
+# `zatca_payment_means_codes` in site_config.json; that map is read on every
+# lookup, never cached, so a change applies right away.
+CASH = "10"
+CHEQUE = "20"
+CREDIT_TRANSFER = "30"
+BANK_CARD = "54"
+
+DEFAULT_CODE = CREDIT_TRANSFER
+
+# Matched, in order, against the lower-cased name of the Mode of Payment
+NAME_CODES = (
+    ("cash", CASH),
+    ("credit card", BANK_CARD),
+    ("bank transfer", CREDIT_TRANSFER),
+    ("cheque", CHEQUE),
+    ("electronic payment", CREDIT_TRANSFER),
+)
+
+# Used when the name matches none of the above
+TYPE_CODES = {"Cash": CASH, "Bank": CREDIT_TRANSFER}
+
+
+def get_payment_means_code(doc):
+    """UNTDID 4461 code of an invoice, or None when it has no mode of payment.
+
+    POS invoices take the code of their largest `payments` row.
+    """
+
+    mode_of_payment = doc.get("mode_of_payment")
+    payments = doc.get("payments")
+    if payments:
+        largest = max(payments, key=lambda payment: abs(payment.amount or 0))
+        mode_of_payment = largest.mode_of_payment or mode_of_payment
+
+    if not mode_of_payment:
+        return None
+
+    return get_code(mode_of_payment)
+
+
+def get_code(mode_of_payment):
+    overrides = frappe.conf.get("zatca_payment_means_codes") or {}
+    if mode_of_payment in overrides:
+        return str(overrides[mode_of_payment])
+
+    code = get_code_table().get(mode_of_payment)
+    if code is None:
+        # Not a Mode of Payment record, e.g. free text on an imported invoice
+        code = resolve_code(mode_of_payment)
+    return code
+
+
+def get_code_table():
+    """Map of every Mode of Payment to its code without the site config overrides, cached per site"""
+    return frappe.cache().get_value(CACHE_KEY, generator=_build)
+
+
+def clear_cache(*args, **kwargs):
+    """Mode of Payment hook: rebuild the table on next use"""
+    frappe.cache().delete_value(CACHE_KEY)
+
+
+def resolve_code(mode_of_payment, payment_type=None):
+    name = str(mode_of_payment).lower()
+    for keyword, code in NAME_CODES:
+        if keyword in name:
+            return code
+
+    return TYPE_CODES.get(payment_type, DEFAULT_CODE)
+
+
+def _build():
+    return {
+        mode.name: resolve_code(mode.name, mode.type)
+        for mode in frappe.get_all("Mode of Payment", fields=["name", "type"])
+    }
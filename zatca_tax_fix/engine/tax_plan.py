@@ -0,0 +1,95 @@
+"""Tax rows compiled into cached plans of operations.
+
+A plan holds one operation per tax row, chosen once for the row's charge
+type with its rate already converted to integer units, so evaluating the
+taxes of an invoice is a straight loop of calls. An operation depends only
+on its row's charge type and rate, so plans are keyed by the
+(charge_type, rate) signature of the rows and kept per worker; nothing
+needs invalidating when a Sales Taxes and Charges Template changes.
+"""
+
+from zatca_tax_fix.engine.money import (
+    CURRENCY_SCALE,
+    from_units,
+    percent_of,
+    rate_units,
+    round_div,
+    to_units,
+)
+
+MAX_PLANS = 512
+
+DEFAULT_VAT_RATE = 15.0
+
+_plans = {}
+
+
+def get_tax_plan(taxes):
+    """Operations `op(tax, net_total, running_total, actual_tax_resets)` for the rows.
+
+    Each operation returns the tax amount of its row in halalas.
+    """
+
+    signature = tuple((tax.charge_type, tax.rate) for tax in taxes)
+
+    plan = _plans.get(signature)
+    if plan is None:
+        if len(_plans) >= MAX_PLANS:
+            _plans.clear()
+        plan = _plans[signature] = tuple(
+            compile_row(charge_type, rate) for charge_type, rate in signature)
+
+    return plan
+
+
+def compile_row(charge_type, rate):
+    if charge_type == "On Net Total" and rate:
+        units = rate_units(rate)
+
+        def on_net_total(tax, net_total, running_total, actual_tax_resets):
+            return percent_of(net_total, units)
+
+        return on_net_total
+
+    if charge_type == "On Previous Row Total" and rate:
+        units = rate_units(rate)
+
+        def on_previous_row_total(tax, net_total, running_total, actual_tax_resets):
+            return percent_of(running_total, units)
+
+        return on_previous_row_total
+
+    if charge_type == "Actual":
+        units = rate_units(rate) if rate and rate > 0 else None
+
+        def actual(tax, net_total, running_total, actual_tax_resets):
+            rate = units
+            if rate is None:
+                rate = rate_units(_derive_rate(tax, net_total))
+
+            # Actual rows cannot be included in the item rate, so they are
+            # converted to a document level percentage
+            tax.charge_type = "On Net Total"
+            for field, value in actual_tax_resets:
+                setattr(tax, field, value)
+
+            return percent_of(net_total, rate)
+
+        return actual
+
+    def stored_amount(tax, net_total, running_total, actual_tax_resets):
+        return to_units(tax.tax_amount)
+
+    return stored_amount
+
+
+def _derive_rate(tax, net_total):
+    """Rate, to two decimals, of the amount entered by the user; set on the row"""
+
+    tax_amount = to_units(tax.tax_amount)
+    if tax_amount and net_total > 0:
+        tax.rate = from_units(round_div(tax_amount * 100 * CURRENCY_SCALE, net_total))
+    else:
+        tax.rate = DEFAULT_VAT_RATE
+
+    return tax.rate
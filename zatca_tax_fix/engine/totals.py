@@ -0,0 +1,534 @@
+import frappe
+
+from zatca_tax_fix.engine import log, vectorized
+from zatca_tax_fix.engine.allocation import distribute
+from zatca_tax_fix.engine.dirty import ItemCache
+from zatca_tax_fix.engine.fields import get_field_map
+from zatca_tax_fix.engine.instrumentation import count, laps
+from zatca_tax_fix.engine.ledger import AGGRESSIVE, already_applied, record
+from zatca_tax_fix.engine.money import (
+    EXCHANGE_PLACES,
+    EXCHANGE_SCALE,
+    QTY_PLACES,
+    convert,
+    from_units,
+    multiply,
+    percent_of,
+    rate_units,
+    round_amount,
+    round_whole,
+    to_units,
+)
+from zatca_tax_fix.engine.tax_plan import DEFAULT_VAT_RATE, get_tax_plan
+from zatca_tax_fix.engine.vat_accounts import OTHER_TAX, VAT, get_classification
+from zatca_tax_fix.engine.writeback import take_snapshot, write_back
+
+# Standard invoices take a shorter path; 0 in site config disables it
+FAST_PATH_KEY = "zatca_tax_fix_fast_path"
+STANDARD_CURRENCY = "SAR"
+STANDARD_VAT_RATE = 15
+
+# Header fields rounded to currency precision, with their base_ equivalents
+PRECISION_FIELDS = (
+    'discount_amount', 'write_off_amount', 'paid_amount',
+    'change_amount', 'total_advance', 'allocated_amount'
+)
+
+# Everything the engine reads or writes, fingerprinted between passes. The
+# written fields matter as much as the read ones: ERPNext's own
+# calculate_taxes_and_totals rewrites the base amounts in validate, and a
+# pass is only skipped while the engine's values are still in place
+FINGERPRINT_FIELDS = {
+    "invoice": (
+        'conversion_rate', 'currency', 'net_total', 'total_taxes_and_charges', 'grand_total',
+        'outstanding_amount', 'rounded_total', 'item_wise_vat_total', 'base_net_total',
+        'base_total_taxes_and_charges', 'base_grand_total', 'base_outstanding_amount',
+        'base_rounded_total', *PRECISION_FIELDS, *(f'base_{field}' for field in PRECISION_FIELDS)
+    ),
+    "item": (
+        'rate', 'qty', 'amount', 'item_tax_template', 'tax_inclusive_rate', 'tax_amount',
+        'base_rate', 'base_amount', 'base_net_rate', 'base_net_amount'
+    ),
+    "tax": (
+        'charge_type', 'rate', 'tax_amount', 'account_head', 'total', 'base_tax_amount',
+        'base_total', 'included_in_print_rate', 'included_in_paid_amount'
+    ),
+}
+
+
+def apply_totals(doc, stage=None, aggressive=False):
+    """Recompute every total of a Sales Invoice in one pass over its rows.
+
+    `stage` names the lifecycle stage calling the engine; a stage that has
+    already been applied to this document, with the invoice unchanged since,
+    is not run again (see `engine.ledger`). The fix is also skipped when
+    nothing it reads has changed since it was last applied.
+    """
+
+    if not doc.get("items"):
+        return
+
+    try:
+        steps = laps("apply_totals", doc)
+
+        fingerprint = get_fingerprint(doc)
+        steps.lap("fingerprint")
+
+        ledger_key = AGGRESSIVE if aggressive and doc.name else stage
+        if ledger_key and already_applied(doc, ledger_key, fingerprint):
+            return
+
+        if aggressive and doc.name:
+            take_snapshot(doc)
+
+        if fingerprint != doc.flags.zatca_totals_fingerprint:
+            compute_totals(doc)
+            fingerprint = get_fingerprint(doc)
+            doc.flags.zatca_totals_fingerprint = fingerprint
+            steps.lap("compute")
+
+            log.applied(doc, stage or "direct")
+
+        if aggressive and doc.name:
+            write_back(doc)
+            steps.lap("write_back")
+
+        if ledger_key:
+            record(doc, ledger_key, fingerprint)
+
+    except Exception as e:
+        log.error(stage or "direct", doc.name, e)
+        frappe.log_error(f"Precision Fix Error for {doc.name}: {e!s}")
+
+
+def get_fingerprint(doc):
+    """Cheap hash over everything the engine reads and every value it owns.
+
+    Taken after a fix, it matches again only while no hook or user edit has
+    touched those values, so the next pass can be skipped.
+    """
+
+    item_fields = FINGERPRINT_FIELDS["item"]
+    tax_fields = FINGERPRINT_FIELDS["tax"]
+
+    return hash((
+        tuple(map(doc.get, FINGERPRINT_FIELDS["invoice"])),
+        tuple(tuple(map(item.get, item_fields)) for item in doc.get("items")),
+        tuple(tuple(map(tax.get, tax_fields)) for tax in doc.get("taxes") or []),
+        tuple(payment.payment_amount for payment in doc.get("payment_schedule") or []),
+        tuple(advance.allocated_amount for advance in doc.get("advances") or []),
+    ))
+
+
+def compute_totals(doc):
+    """Single pass over items, taxes, payment schedule and advances.
+
+    Amounts are read into integer halalas once, all arithmetic is exact and
+    the results are written back once, so header totals always equal the sum
+    of their rows in both transaction and base currency.
+    """
+
+    steps = laps("compute_totals", doc)
+    exchange_rate = to_units(doc.conversion_rate, EXCHANGE_PLACES)
+
+    fields = get_field_map()
+
+    items = doc.get("items")
+    taxes = doc.get("taxes") or []
+    vat_accounts = get_classification(doc.company) if taxes else {}
+    flags = getattr(doc, 'flags', None)
+
+    cache = flags.zatca_item_cache if flags is not None else None
+
+    # Later passes on a standard invoice are incremental through its cache
+    if not cache and is_standard_invoice(doc, items, taxes, exchange_rate, vat_accounts):
+        count("compute_totals.standard")
+        cache = _compute_standard_totals(doc, items, taxes[0], fields)
+        cache.remember(items)
+        if flags is not None:
+            flags.zatca_item_cache = cache
+        steps.lap("standard")
+        return
+
+    count("compute_totals.full")
+
+    # Items: rate, qty, amount, base amounts and tax inclusion reset. Rows
+    # unchanged since the previous pass on this document are not recomputed
+    dirty = cache.get_dirty(items, exchange_rate, fields) if cache else None
+
+    if dirty is None:
+        amounts, net_total, base_net_total = _compute_items(items, exchange_rate, fields)
+        cache = ItemCache(items, amounts, net_total, base_net_total, exchange_rate, fields)
+    else:
+        changed, _, _ = _compute_items([items[index] for index in dirty], exchange_rate, fields)
+        # Enough dirty rows take the batch path; keep numpy scalars off the document
+        if vectorized.is_array(changed):
+            changed = changed.tolist()
+        cache.update(dirty, changed)
+        amounts, net_total, base_net_total = cache.amounts, cache.net_total, cache.base_net_total
+
+    doc.net_total = from_units(net_total)
+    steps.lap("items")
+
+    # Taxes: charge types, item-wise VAT reconciliation and running totals
+    total_taxes = base_total_taxes = 0
+    running_total = net_total
+    vat_tax = None
+    set_base_tax_amount = 'base_tax_amount' in fields.tax
+    set_base_total = 'base_total' in fields.tax
+    plan = get_tax_plan(taxes)
+
+    for tax, op in zip(taxes, plan, strict=True):
+        tax_amount = op(tax, net_total, running_total, fields.actual_tax_resets)
+
+        if vat_tax is None and is_vat_row(tax, vat_accounts):
+            vat_tax = tax
+            tax_amount = reconcile_item_wise_vat(doc, tax, items, amounts, tax_amount, cache)
+            if 'item_wise_vat_total' in fields.invoice:
+                doc.item_wise_vat_total = from_units(tax_amount)
+
+        tax.tax_amount = from_units(tax_amount)
+        total_taxes += tax_amount
+        running_total += tax_amount
+        tax.total = from_units(running_total)
+
+        if exchange_rate:
+            base_tax_amount = convert(tax_amount, exchange_rate)
+            base_total_taxes += base_tax_amount
+
+            if set_base_tax_amount:
+                tax.base_tax_amount = from_units(base_tax_amount)
+            if set_base_total:
+                tax.base_total = from_units(base_net_total + base_total_taxes)
+
+    if vat_tax is None:
+        cache.vat_rate = cache.item_wise_vat = None
+    cache.remember(items)
+    if flags is not None:
+        flags.zatca_item_cache = cache
+
+    steps.lap("taxes")
+
+    # Document totals
+    grand_total = net_total + total_taxes
+
+    doc.total_taxes_and_charges = from_units(total_taxes)
+    doc.grand_total = from_units(grand_total)
+    doc.outstanding_amount = doc.grand_total
+
+    if 'rounded_total' in fields.invoice:
+        doc.rounded_total = from_units(round_whole(grand_total))
+
+    if exchange_rate:
+        base_grand_total = base_net_total + base_total_taxes
+
+        doc.base_net_total = from_units(base_net_total)
+        doc.base_total_taxes_and_charges = from_units(base_total_taxes)
+        doc.base_grand_total = from_units(base_grand_total)
+        doc.base_outstanding_amount = doc.base_grand_total
+
+        if 'base_rounded_total' in fields.invoice:
+            doc.base_rounded_total = from_units(round_whole(base_grand_total))
+
+    steps.lap("totals")
+
+    # Additional header amounts that end up in GL entries
+    _round_precision_fields(doc, exchange_rate, fields)
+    steps.lap("precision_fields")
+
+    # Payment schedule must add up to the grand total
+    payment_schedule = doc.get("payment_schedule")
+    if payment_schedule:
+        scheduled = []
+        for payment in payment_schedule:
+            payment_amount = to_units(payment.payment_amount)
+            if payment_amount:
+                payment.payment_amount = from_units(payment_amount)
+            scheduled.append(payment_amount)
+
+        difference = grand_total - sum(scheduled)
+        if difference:
+            shares = distribute(difference, [abs(amount) for amount in scheduled])
+            for payment, amount, share in zip(payment_schedule, scheduled, shares, strict=True):
+                if share:
+                    payment.payment_amount = from_units(amount + share)
+
+    steps.lap("payment_schedule")
+
+    for advance in doc.get("advances") or []:
+        if advance.allocated_amount:
+            advance.allocated_amount = round_amount(advance.allocated_amount)
+
+    steps.lap("advances")
+
+
+def is_standard_invoice(doc, items, taxes, exchange_rate, vat_accounts):
+    """SAR at rate 1 with a single 15% VAT row on net total, no advances or payment schedule"""
+
+    if len(taxes) != 1 or doc.get("advances") or doc.get("payment_schedule"):
+        return False
+    if not frappe.conf.get(FAST_PATH_KEY, 1) or vectorized.use_batch(items):
+        return False
+
+    tax = taxes[0]
+    return (
+        tax.charge_type == "On Net Total"
+        and tax.rate == STANDARD_VAT_RATE
+        and exchange_rate == EXCHANGE_SCALE
+        and doc.get("currency") == STANDARD_CURRENCY
+        and is_vat_row(tax, vat_accounts)
+    )
+
+
+def _compute_standard_totals(doc, items, vat_tax, fields):
+    """`compute_totals` for a standard invoice in one loop over the items.
+
+    Base amounts equal the transaction amounts and the VAT row is the sum of
+    the per-item VAT, so the results are those of the full pass. Returns the
+    `ItemCache` the full pass would have built.
+    """
+
+    base_rate_fields = [field for field in ('base_rate', 'base_net_rate') if field in fields.item]
+    base_amount_fields = [field for field in ('base_amount', 'base_net_amount') if field in fields.item]
+    item_resets = fields.item_resets
+    store_on_items = 'tax_amount' in fields.item
+    vat_rate = rate_units(STANDARD_VAT_RATE)
+
+    amounts = []
+    net_total = item_wise_vat = 0
+
+    for item in items:
+        rate = to_units(item.rate)
+        qty = to_units(item.qty, QTY_PLACES)
+
+        if rate and qty:
+            amount = multiply(rate, qty)
+        else:
+            amount = to_units(item.amount)
+
+        # Each value is converted once and shared by its base fields
+        rate_value = from_units(rate)
+        amount_value = from_units(amount)
+
+        if item.rate:
+            item.rate = rate_value
+        if item.qty:
+            item.qty = from_units(qty, QTY_PLACES)
+        if amount or item.amount:
+            item.amount = amount_value
+
+        amounts.append(amount)
+        net_total += amount
+
+        for field in base_rate_fields:
+            setattr(item, field, rate_value)
+        for field in base_amount_fields:
+            setattr(item, field, amount_value)
+        for field, value in item_resets:
+            setattr(item, field, value)
+
+        if amount:
+            item_vat = percent_of(amount, vat_rate)
+            item_wise_vat += item_vat
+            if store_on_items:
+                item.tax_amount = from_units(item_vat)
+
+    _log_vat_mismatch(doc, item_wise_vat, percent_of(net_total, vat_rate))
+
+    cache = ItemCache(items, amounts, net_total, net_total, EXCHANGE_SCALE, fields)
+    cache.vat_rate = vat_rate
+    cache.item_wise_vat = item_wise_vat
+
+    grand_total = net_total + item_wise_vat
+    rounded_total = from_units(round_whole(grand_total))
+    net_total, vat, grand_total = (
+        from_units(net_total), from_units(item_wise_vat), from_units(grand_total))
+
+    vat_tax.tax_amount = vat
+    vat_tax.total = grand_total
+    if 'base_tax_amount' in fields.tax:
+        vat_tax.base_tax_amount = vat
+    if 'base_total' in fields.tax:
+        vat_tax.base_total = grand_total
+    if 'item_wise_vat_total' in fields.invoice:
+        doc.item_wise_vat_total = vat
+
+    doc.net_total = doc.base_net_total = net_total
+    doc.total_taxes_and_charges = doc.base_total_taxes_and_charges = vat
+    doc.grand_total = doc.base_grand_total = grand_total
+    doc.outstanding_amount = doc.base_outstanding_amount = grand_total
+
+    if 'rounded_total' in fields.invoice:
+        doc.rounded_total = rounded_total
+    if 'base_rounded_total' in fields.invoice:
+        doc.base_rounded_total = rounded_total
+
+    _round_precision_fields(doc, EXCHANGE_SCALE, fields)
+    return cache
+
+
+def _round_precision_fields(doc, exchange_rate, fields):
+    for field in PRECISION_FIELDS:
+        value = to_units(doc.get(field))
+        if not value:
+            continue
+
+        setattr(doc, field, from_units(value))
+        base_field = f'base_{field}'
+        if exchange_rate and base_field in fields.invoice:
+            setattr(doc, base_field, from_units(convert(value, exchange_rate)))
+
+
+def _compute_items(items, exchange_rate, fields):
+    """Item amounts in halalas with the net and base net totals; arrays for large invoices"""
+
+    if vectorized.use_batch(items):
+        try:
+            return vectorized.compute_items(items, exchange_rate, fields)
+        except vectorized.Overflow:
+            pass
+
+    set_base_rate = 'base_rate' in fields.item
+    set_base_amount = 'base_amount' in fields.item
+    set_base_net_rate = 'base_net_rate' in fields.item
+    set_base_net_amount = 'base_net_amount' in fields.item
+    item_resets = fields.item_resets
+
+    amounts = []
+    net_total = base_net_total = 0
+
+    for item in items:
+        rate = to_units(item.rate)
+        qty = to_units(item.qty, QTY_PLACES)
+
+        if rate and qty:
+            amount = multiply(rate, qty)
+        else:
+            amount = to_units(item.amount)
+
+        if item.rate:
+            item.rate = from_units(rate)
+        if item.qty:
+            item.qty = from_units(qty, QTY_PLACES)
+        if amount or item.amount:
+            item.amount = from_units(amount)
+
+        amounts.append(amount)
+        net_total += amount
+
+        if exchange_rate:
+            base_amount = convert(amount, exchange_rate)
+            base_net_total += base_amount
+
+            if set_base_rate or set_base_net_rate:
+                base_rate = from_units(convert(rate, exchange_rate))
+                if set_base_rate:
+                    item.base_rate = base_rate
+                if set_base_net_rate:
+                    item.base_net_rate = base_rate
+            if set_base_amount:
+                item.base_amount = from_units(base_amount)
+            if set_base_net_amount:
+                item.base_net_amount = from_units(base_amount)
+
+        # Taxes are applied at document level only
+        for field, value in item_resets:
+            setattr(item, field, value)
+
+
+    return amounts, net_total, base_net_total
+
+
+def is_vat_row(tax, vat_accounts):
+    """Whether the tax row is the VAT row ZATCA compares item-wise VAT against.
+
+    `vat_accounts` is the company's classification from `get_classification`;
+    an unclassified Tax account still counts as VAT at the standard rate.
+    """
+    kind = vat_accounts.get(tax.account_head)
+    return kind == VAT or (kind == OTHER_TAX and tax.rate == 15)
+
+
+def get_vat_row(taxes, vat_accounts):
+    """First tax row `is_vat_row` accepts, or None"""
+    return next((tax for tax in taxes if is_vat_row(tax, vat_accounts)), None)
+
+
+def get_item_wise_vat(vat_tax, amounts):
+    """Sum in halalas of the VAT of each line amount, each rounded on its own"""
+    vat_rate = rate_units(vat_tax.rate or DEFAULT_VAT_RATE)
+    return sum(percent_of(amount, vat_rate) for amount in amounts)
+
+
+def reconcile_item_wise_vat(doc, vat_tax, items, amounts, document_vat, cache=None):
+    """VAT row amount in halalas, equal to the sum of the per-item rounded VAT.
+
+    With the `ItemCache` of the pass, only the rows it recomputed are
+    reconciled again when the VAT rate is unchanged.
+    """
+
+    vat_rate = rate_units(vat_tax.rate or DEFAULT_VAT_RATE)
+    store_on_items = 'tax_amount' in get_field_map().item
+    item_wise_vat = cache.get_item_wise_vat(items, vat_rate, store_on_items) if cache else None
+
+    if item_wise_vat is None:
+        if vectorized.is_array(amounts):
+            try:
+                item_wise_vat = vectorized.item_wise_vat(items, amounts, vat_rate, store_on_items)
+            except vectorized.Overflow:
+                item_wise_vat = _item_wise_vat(items, amounts.tolist(), vat_rate, store_on_items)
+        else:
+            item_wise_vat = _item_wise_vat(items, amounts, vat_rate, store_on_items)
+
+        if cache:
+            # Every row was written, so every row needs a new snapshot
+            cache.dirty = None
+
+    if cache:
+        cache.vat_rate = vat_rate
+        cache.item_wise_vat = item_wise_vat
+
+    _log_vat_mismatch(doc, item_wise_vat, document_vat)
+    return item_wise_vat
+
+
+def _log_vat_mismatch(doc, item_wise_vat, document_vat):
+    if item_wise_vat != document_vat:
+        log.adjustment(
+            "vat_mismatch_adjusted", doc.name,
+            item_wise=from_units(item_wise_vat),
+            document=from_units(document_vat),
+            diff=from_units(item_wise_vat - document_vat),
+        )
+
+
+def _item_wise_vat(items, amounts, vat_rate, store_on_items):
+    item_wise_vat = 0
+
+    for item, amount in zip(items, amounts, strict=True):
+        if not amount:
+            continue
+
+        item_vat = percent_of(amount, vat_rate)
+        item_wise_vat += item_vat
+
+        # Stored on the item for ZATCA reference
+        if store_on_items:
+            item.tax_amount = from_units(item_vat)
+
+    return item_wise_vat
+
+
+def reset_tax_inclusion(doc):
+    """Keep all taxes at document level, never included in the item rate"""
+
+    fields = get_field_map()
+
+    for item in doc.get("items"):
+        for field, value in fields.item_resets:
+            setattr(item, field, value)
+
+    for tax in doc.get("taxes") or []:
+        if tax.charge_type == "Actual":
+            for field, value in fields.actual_tax_resets:
+                setattr(tax, field, value)
@@ -0,0 +1,60 @@
+import frappe
+
+CACHE_KEY = "zatca_vat_accounts"
+
+# Matched case-insensitively against the account, its name and its parent
+# group. Sites can override them with `zatca_vat_account_patterns` in
+# site_config.json.
+DEFAULT_VAT_PATTERNS = ("VAT", "ضريبة القيمة المضافة")
+
+VAT = "VAT"
+OTHER_TAX = "Tax"
+
+
+def get_classification(company):
+    """Map of the Tax accounts of a company to VAT or OTHER_TAX, cached per site.
+
+    Without a company every Tax account of the site is classified. Entries
+    are stored with the patterns they were built with and rebuilt when
+    `zatca_vat_account_patterns` changes.
+    """
+
+    patterns = get_vat_patterns()
+    cached = frappe.cache().hget(CACHE_KEY, company or "")
+    if cached and cached[0] == patterns:
+        return cached[1]
+
+    classification = _build(company, patterns)
+    frappe.cache().hset(CACHE_KEY, company or "", (patterns, classification))
+    return classification
+
+
+def clear_cache(doc, method=None, *args, **kwargs):
+    """Account hook: drop the classification of the account's company and of the whole site"""
+    frappe.cache().hdel(CACHE_KEY, doc.company or "")
+    frappe.cache().hdel(CACHE_KEY, "")
+
+
+def get_vat_patterns():
+    patterns = frappe.conf.get("zatca_vat_account_patterns") or DEFAULT_VAT_PATTERNS
+    return tuple(str(pattern).upper() for pattern in patterns)
+
+
+def _build(company, patterns):
+    filters = {"account_type": "Tax", "is_group": 0}
+    if company:
+        filters["company"] = company
+
+    classification = {}
+
+    for account in frappe.get_all(
+        "Account", filters=filters, fields=["name", "account_name", "parent_account"]
+    ):
+        searched = " ".join(
+            filter(None, (account.name, account.account_name, account.parent_account))
+        ).upper()
+        classification[account.name] = (
+            VAT if any(pattern in searched for pattern in patterns) else OTHER_TAX
+        )
+
+    return classification
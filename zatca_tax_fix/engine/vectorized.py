@@ -0,0 +1,172 @@
+"""NumPy versions of the per-item steps of the totals engine, for large invoices.
+
+Columns are read once into int64 arrays of minor units and computed with the
+rounding of `engine.money`, so results are identical to the pure Python
+path. That path stays in use when NumPy is not installed, for invoices below
+`"zatca_tax_fix_batch_threshold"` items (site config, 0 disables batch mode)
+and whenever a product could overflow int64.
+"""
+
+import frappe
+
+from zatca_tax_fix.engine.money import (
+    CURRENCY_PLACES,
+    EXCHANGE_SCALE,
+    PERCENT_SCALE,
+    QTY_PLACES,
+    QTY_SCALE,
+)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+CONFIG_KEY = "zatca_tax_fix_batch_threshold"
+DEFAULT_THRESHOLD = 100
+
+# Operands are checked against this bound before any multiplication
+INT64_SAFE = 2 ** 62
+
+
+class Overflow(Exception):
+    """An intermediate value would not fit in int64; use the Python path"""
+
+
+def use_batch(items):
+    if np is None:
+        return False
+
+    threshold = frappe.conf.get(CONFIG_KEY)
+    threshold = DEFAULT_THRESHOLD if threshold is None else int(threshold)
+    return 0 < threshold <= len(items)
+
+
+def is_array(values):
+    return np is not None and isinstance(values, np.ndarray)
+
+
+def column(rows, field):
+    """Float array of a field over the rows, None read as 0"""
+    return np.fromiter((getattr(row, field) or 0 for row in rows), dtype=np.float64, count=len(rows))
+
+
+def to_units(values, places=CURRENCY_PLACES):
+    """`money.to_units` over an array, half away from zero"""
+
+    scaled = np.round(values * 10 ** places, 8)
+    magnitude = np.abs(scaled)
+    if magnitude.size and magnitude.max() >= INT64_SAFE:
+        raise Overflow
+
+    units = np.floor(magnitude + 0.5).astype(np.int64)
+    return np.where(scaled < 0, -units, units)
+
+
+def from_units(units, places=CURRENCY_PLACES):
+    return units / 10 ** places
+
+
+def round_div(numerator, denominator):
+    """`money.round_div` over an array, half away from zero"""
+
+    quotient, remainder = np.divmod(np.abs(numerator), denominator)
+    quotient += 2 * remainder >= denominator
+    return np.where(numerator < 0, -quotient, quotient)
+
+
+def multiply(left, right, denominator):
+    """round_div(left * right, denominator) after checking the product fits"""
+
+    if _max_abs(left) * _max_abs(right) >= INT64_SAFE:
+        raise Overflow
+    return round_div(left * right, denominator)
+
+
+def convert(units, exchange_rate):
+    if exchange_rate == EXCHANGE_SCALE:
+        return units
+    return multiply(units, exchange_rate, EXCHANGE_SCALE)
+
+
+def compute_items(items, exchange_rate, fields):
+    """The items step of `compute_totals` on arrays.
+
+    Returns (amounts array, net total, base net total). Only values that
+    differ from the stored ones are written back to the rows.
+    """
+
+    stored_rates = column(items, 'rate')
+    stored_qtys = column(items, 'qty')
+    stored_amounts = column(items, 'amount')
+
+    rates = to_units(stored_rates)
+    qtys = to_units(stored_qtys, QTY_PLACES)
+    amounts = np.where(
+        (rates != 0) & (qtys != 0),
+        multiply(rates, qtys, QTY_SCALE),
+        to_units(stored_amounts),
+    )
+
+    updates = [
+        ('rate', stored_rates, from_units(rates)),
+        ('qty', stored_qtys, from_units(qtys, QTY_PLACES)),
+        ('amount', stored_amounts, from_units(amounts)),
+    ]
+
+    base_net_total = 0
+    if exchange_rate:
+        base_amounts = convert(amounts, exchange_rate)
+        base_net_total = int(base_amounts.sum())
+
+        if 'base_rate' in fields.item or 'base_net_rate' in fields.item:
+            base_rates = from_units(convert(rates, exchange_rate))
+            for field in ('base_rate', 'base_net_rate'):
+                if field in fields.item:
+                    updates.append((field, column(items, field), base_rates))
+
+        for field in ('base_amount', 'base_net_amount'):
+            if field in fields.item:
+                updates.append((field, column(items, field), from_units(base_amounts)))
+
+    for field, stored, values in updates:
+        set_changed(items, field, stored, values)
+
+    # Taxes are applied at document level only
+    for field, value in fields.item_resets:
+        for item in items:
+            setattr(item, field, value)
+
+    return amounts, int(amounts.sum()), base_net_total
+
+
+def item_wise_vat(items, amounts, vat_rate, store_on_items):
+    """Per-item rounded VAT of the line amounts, summed, in minor units"""
+
+    item_vat = multiply(amounts, vat_rate, PERCENT_SCALE)
+
+    if store_on_items:
+        values = from_units(item_vat).tolist()
+        for index in np.flatnonzero(amounts).tolist():
+            items[index].tax_amount = values[index]
+
+    return int(item_vat.sum())
+
+
+def set_changed(rows, field, stored, values):
+    """Write `values` to the rows where they differ from `stored`"""
+
+    changed = np.flatnonzero(stored != values).tolist()
+    if not changed:
+        return
+
+    values = values.tolist()
+    for index in changed:
+        setattr(rows[index], field, values[index])
+
+
+def _max_abs(values):
+    if is_array(values):
+        return int(np.abs(values).max()) if values.size else 0
+    return abs(values)
@@ -0,0 +1,142 @@
+import frappe
+
+from zatca_tax_fix.engine.instrumentation import span
+
+# Never the outstanding amounts: ERPNext sets them itself while posting the
+# invoice (POS payments, allocated advances), after on_submit has queued the
+# write-back, and recomputes them from the Payment Ledger later on
+HEADER_FIELDS = (
+    'net_total', 'total_taxes_and_charges', 'grand_total',
+    'base_net_total', 'base_total_taxes_and_charges', 'base_grand_total'
+)
+
+TAX_FIELDS = ('tax_amount', 'total', 'base_tax_amount', 'base_total')
+
+PERSISTED_FIELDS = {
+    "Sales Invoice": HEADER_FIELDS,
+    "Sales Taxes and Charges": TAX_FIELDS,
+}
+
+
+def take_snapshot(doc):
+    """Remember the stored values of the fields the aggressive fix writes.
+
+    Taken on the first aggressive pass, which in the lifecycle runs right
+    after the framework has written the document (on_submit) or right after
+    it was loaded (make_gl_entries on repost), so memory equals the database.
+    """
+
+    if doc.flags.zatca_persisted_values is None:
+        doc.flags.zatca_persisted_values = get_values(doc)
+
+
+def write_back(doc):
+    """Queue the fixed totals to be persisted directly, bypassing the document cycle.
+
+    Only columns that differ from the last persisted snapshot are queued, so
+    an unchanged invoice produces no statement at all. Queued values are
+    written once, inside the framework's own transaction, just before it
+    commits; see `flush_pending_writes`.
+    """
+
+    values = get_values(doc)
+    snapshot = doc.flags.zatca_persisted_values or {}
+
+    changes = get_changes(snapshot, values)
+    if not changes:
+        return
+
+    pending = _get_pending_writes()
+    for (doctype, name), fields in changes.items():
+        pending.setdefault(doctype, {}).setdefault(name, {}).update(fields)
+
+    doc.flags.zatca_persisted_values = values
+
+
+def get_changes(snapshot, values):
+    """Changed columns per (doctype, name) between two `get_values` results"""
+
+    changes = {}
+    for key, row in values.items():
+        previous = snapshot.get(key)
+        fields = PERSISTED_FIELDS[key[0]]
+
+        changed = {
+            field: value
+            for index, (field, value) in enumerate(zip(fields, row, strict=True))
+            if previous is None or previous[index] != value
+        }
+        if changed:
+            changes[key] = changed
+
+    return changes
+
+
+def flush_pending_writes():
+    """Write every queued change: one statement per doctype"""
+
+    pending = getattr(frappe.local, 'zatca_pending_writes', None)
+    frappe.local.zatca_pending_writes = None
+
+    with span("writeback.flush"):
+        for doctype, rows in (pending or {}).items():
+            if rows:
+                bulk_update(doctype, PERSISTED_FIELDS[doctype], rows)
+
+
+def discard_pending_writes():
+    """Drop queued writes when the transaction is rolled back"""
+    frappe.local.zatca_pending_writes = None
+
+
+def _get_pending_writes():
+    pending = getattr(frappe.local, 'zatca_pending_writes', None)
+
+    if pending is None:
+        pending = frappe.local.zatca_pending_writes = {}
+        frappe.db.before_commit.add(flush_pending_writes)
+        frappe.db.after_rollback.add(discard_pending_writes)
+
+    return pending
+
+
+def get_values(doc):
+    """Values of the persisted fields keyed by (doctype, name)"""
+
+    values = {
+        ("Sales Invoice", doc.name): tuple(doc.get(field) or 0 for field in HEADER_FIELDS)
+    }
+    for tax in doc.get("taxes") or []:
+        if tax.name:
+            values[("Sales Taxes and Charges", tax.name)] = tuple(
+                tax.get(field) or 0 for field in TAX_FIELDS)
+
+    return values
+
+
+def bulk_update(doctype, fields, rows):
+    """Update several rows of `doctype` in one statement.
+
+    `rows` maps row name to a dict of changed columns. Each column is only
+    assigned for the rows where it changed; other rows keep their value.
+    """
+
+    assignments = []
+    values = []
+
+    for field in fields:
+        names = [name for name, changed in rows.items() if field in changed]
+        if not names:
+            continue
+
+        cases = " ".join("WHEN %s THEN %s" for _ in names)
+        assignments.append(f"`{field}` = CASE name {cases} ELSE `{field}` END")
+        for name in names:
+            values.extend((name, rows[name][field]))
+
+    placeholders = ", ".join(["%s"] * len(rows))
+    frappe.db.sql(f"""
+        UPDATE `tab{doctype}`
+        SET {", ".join(assignments)}
+        WHERE name IN ({placeholders})
+    """, (*values, *rows))
@@ -57,12 +57,29 @@ override_doctype_class = {
 	"Sales Invoice": "zatca_tax_fix.overrides.sales_invoice.CustomSalesInvoice"
 }
 
-# Document Events - Sales Invoice Only
+# Document Events
 doc_events = {
 	"Sales Invoice": {
 		"before_validate": "zatca_tax_fix.events.sales_invoice.before_validate",
 		"before_save": "zatca_tax_fix.events.sales_invoice.before_save",
 		"validate": "zatca_tax_fix.events.sales_invoice.validate"
+	},
+	"Account": {
+		"on_update": "zatca_tax_fix.engine.vat_accounts.clear_cache",
+		"on_trash": "zatca_tax_fix.engine.vat_accounts.clear_cache",
+		"after_rename": "zatca_tax_fix.engine.vat_accounts.clear_cache"
+	},
+	"Custom Field": {
+		"on_update": "zatca_tax_fix.engine.fields.clear_field_map",
+		"on_trash": "zatca_tax_fix.engine.fields.clear_field_map"
+	},
+	"DocType": {
+		"on_update": "zatca_tax_fix.engine.fields.clear_field_map"
+	},
+	"Mode of Payment": {
+		"on_update": "zatca_tax_fix.engine.payment_means.clear_cache",
+		"on_trash": "zatca_tax_fix.engine.payment_means.clear_cache",
+		"after_rename": "zatca_tax_fix.engine.payment_means.clear_cache"
 	}
 }
 # Home Pages
@@ -103,6 +120,11 @@ doc_events = {
 # before_uninstall = "zatca_tax_fix.uninstall.before_uninstall"
 # after_uninstall = "zatca_tax_fix.uninstall.after_uninstall"
 
+# Migration
+# ------------
+
+after_migrate = ["zatca_tax_fix.engine.fields.clear_field_map"]
+
 # Integration Setup
 # ------------------
 # To set up dependencies/integrations with other apps
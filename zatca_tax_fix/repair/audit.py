@@ -0,0 +1,106 @@
+"""Dry-run audit of item-wise VAT drift in submitted invoices.
+
+Finds the invoices whose VAT row differs from the sum of the per-item
+rounded VAT, the mismatch `reconcile_item_wise_vat` corrects, with one
+aggregated query per call instead of loading documents. Nothing is written.
+"""
+
+import frappe
+from frappe.utils import cint
+
+from zatca_tax_fix.engine.vat_accounts import OTHER_TAX, VAT, get_classification
+
+DEFAULT_PAGE_LENGTH = 100
+
+# Same rounding as the engine: line amounts to halalas, then the item VAT
+# half away from zero, which is how MariaDB rounds exact decimals
+DRIFT_QUERY = """
+    SELECT
+        vat.parent AS invoice,
+        inv.company,
+        inv.posting_date,
+        ROUND(vat.tax_amount, 2) AS document_vat,
+        SUM(ROUND(ROUND(item.amount, 2) * IF(vat.rate > 0, vat.rate, 15) / 100, 2)) AS item_wise_vat
+    FROM `tabSales Taxes and Charges` vat
+    JOIN `tabSales Invoice` inv ON inv.name = vat.parent
+    JOIN `tabSales Invoice Item` item
+        ON item.parent = vat.parent AND item.parenttype = 'Sales Invoice'
+    WHERE {conditions}
+    GROUP BY vat.parent, vat.name
+    HAVING item_wise_vat <> document_vat
+"""
+
+
+def get_drift_summary(company=None, from_date=None, to_date=None):
+    """Number of drifted invoices with their net and absolute VAT difference"""
+
+    query, values = _get_drift_query(company, from_date, to_date)
+    summary = frappe.db.sql(f"""
+        SELECT
+            COUNT(*) AS invoices,
+            IFNULL(SUM(item_wise_vat - document_vat), 0) AS total_diff,
+            IFNULL(SUM(ABS(item_wise_vat - document_vat)), 0) AS absolute_diff
+        FROM ({query}) drift
+    """, values, as_dict=True)
+
+    return summary[0]
+
+
+def get_drifted_invoices(company=None, from_date=None, to_date=None,
+                         start=0, page_length=DEFAULT_PAGE_LENGTH):
+    """One page of drifted invoices by name; `page_length` 0 returns them all"""
+
+    query, values = _get_drift_query(company, from_date, to_date)
+    limit = ""
+    if cint(page_length):
+        limit = "LIMIT %(page_length)s OFFSET %(start)s"
+        values.update(start=cint(start), page_length=cint(page_length))
+
+    return frappe.db.sql(f"""
+        SELECT *, item_wise_vat - document_vat AS diff
+        FROM ({query}) drift
+        ORDER BY invoice
+        {limit}
+    """, values, as_dict=True)
+
+
+@frappe.whitelist()
+def get_drift_report(company=None, from_date=None, to_date=None,
+                     start=0, page_length=DEFAULT_PAGE_LENGTH):
+    frappe.only_for(("Accounts Manager", "System Manager"))
+    return {
+        "summary": get_drift_summary(company, from_date, to_date),
+        "invoices": get_drifted_invoices(company, from_date, to_date, start, page_length),
+    }
+
+
+def _get_drift_query(company=None, from_date=None, to_date=None):
+    # The VAT row as `is_vat_row` sees it, from the cached account classification
+    classification = get_classification(company)
+    vat_accounts = [account for account, kind in classification.items() if kind == VAT]
+    tax_accounts = [account for account, kind in classification.items() if kind == OTHER_TAX]
+
+    conditions = [
+        "inv.docstatus = 1",
+        "vat.parenttype = 'Sales Invoice'",
+        "vat.parentfield = 'taxes'",
+        "(vat.account_head IN %(vat_accounts)s"
+        " OR (vat.account_head IN %(tax_accounts)s AND vat.rate = 15))",
+    ]
+    if company:
+        conditions.append("inv.company = %(company)s")
+    if from_date:
+        conditions.append("inv.posting_date >= %(from_date)s")
+    if to_date:
+        conditions.append("inv.posting_date <= %(to_date)s")
+
+    values = {
+        # IN () is invalid SQL; an empty name matches no account
+        "vat_accounts": tuple(vat_accounts) or ("",),
+        "tax_accounts": tuple(tax_accounts) or ("",),
+        "company": company,
+        "from_date": from_date,
+        "to_date": to_date,
+    }
+
+    return DRIFT_QUERY.format(conditions=" AND ".join(conditions)), values
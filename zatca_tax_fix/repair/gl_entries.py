@@ -0,0 +1,153 @@
+"""Balance the posted GL entries of submitted Sales Invoices in bulk.
+
+Posted entries are never rewritten: their Payment Ledger Entries and
+transaction currency amounts were booked with them and would drift. Instead
+the debit and credit totals of a chunk of invoices are read with one grouped
+query, and each voucher that does not balance gets the difference posted
+through ERPNext's round-off entry, to the company's round-off account and
+cost center, as ERPNext itself does at submit. Differences above the
+allowance ERPNext's `get_debit_credit_allowance` gives a Sales Invoice are
+not rounding and are only logged. Progress is checkpointed per chunk as in
+`repair.invoices`, and every chunk reports its throughput.
+
+Round-off rows are inserted one GL Entry document per unbalanced voucher,
+not in one bulk statement: each goes through GL Entry validation (closed
+periods, frozen accounts, fiscal year, naming) under its own savepoint, so a
+voucher that fails is skipped without losing the rest of the chunk. Only
+the unbalanced vouchers, a small share of a chunk, get one.
+"""
+
+import time
+
+import frappe
+from frappe.utils import cint
+
+from zatca_tax_fix.engine import log
+from zatca_tax_fix.engine.money import CURRENCY_PLACES, from_units, to_units
+from zatca_tax_fix.repair.invoices import (
+    DEFAULT_CHUNK_SIZE,
+    get_checkpoint,
+    get_checkpoint_key,
+    get_invoice_chunk,
+    new_checkpoint,
+    save_checkpoint,
+)
+
+CHECKPOINT_PREFIX = "zatca_gl_repost_checkpoint"
+
+REMARKS = "Round off posted by zatca-repost-gl-precision"
+
+
+def repost_gl_precision(company=None, from_date=None, to_date=None,
+                        chunk_size=DEFAULT_CHUNK_SIZE, restart=False):
+    """Post round-off entries for unbalanced invoice vouchers, resuming from the checkpoint.
+
+    Returns the checkpoint with the GL entries scanned, plus the elapsed
+    seconds and invoices per second of this run.
+    """
+
+    chunk_size = cint(chunk_size) or DEFAULT_CHUNK_SIZE
+    key = get_checkpoint_key(company, from_date, to_date, prefix=CHECKPOINT_PREFIX)
+    checkpoint = new_checkpoint() if cint(restart) else get_checkpoint(key)
+    checkpoint.setdefault("entries", 0)
+
+    start = time.monotonic()
+    invoices_done = 0
+
+    while not checkpoint["finished"]:
+        invoices = get_invoice_chunk(
+            checkpoint["last_name"], chunk_size, company, from_date, to_date)
+
+        if invoices:
+            entries, repaired = repost_chunk(tuple(invoice.name for invoice in invoices))
+            checkpoint["entries"] += entries
+            checkpoint["repaired"] += repaired
+            checkpoint["scanned"] += len(invoices)
+            checkpoint["last_name"] = invoices[-1].name
+            invoices_done += len(invoices)
+
+        checkpoint["finished"] = len(invoices) < chunk_size
+        save_checkpoint(key, checkpoint)
+        frappe.db.commit()
+
+        elapsed = time.monotonic() - start
+        log.progress(
+            "gl_repost_chunk", job=key, **checkpoint,
+            invoices_per_second=round(invoices_done / elapsed, 1) if elapsed else None,
+        )
+
+    elapsed = time.monotonic() - start
+    checkpoint["seconds"] = round(elapsed, 3)
+    checkpoint["invoices_per_second"] = round(invoices_done / elapsed, 1) if elapsed else None
+    return checkpoint
+
+
+def repost_chunk(invoice_names):
+    """Balance the vouchers of a chunk of invoices; returns (entries read, vouchers balanced)"""
+
+    allowance = get_round_off_allowance()
+
+    vouchers = frappe.db.sql("""
+        SELECT voucher_no, MAX(company) AS company, MAX(posting_date) AS posting_date,
+            MAX(fiscal_year) AS fiscal_year, COUNT(*) AS entries,
+            SUM(debit) AS debit, SUM(credit) AS credit
+        FROM `tabGL Entry`
+        WHERE voucher_type = 'Sales Invoice' AND voucher_no IN %(vouchers)s AND is_cancelled = 0
+        GROUP BY voucher_no
+    """, {"vouchers": invoice_names}, as_dict=True)
+
+    balanced = 0
+    for voucher in vouchers:
+        difference = to_units(voucher.debit) - to_units(voucher.credit)
+        if not difference:
+            continue
+
+        if abs(difference) > allowance:
+            log.adjustment(
+                "gl_repost_skipped", voucher.voucher_no, reason="difference",
+                diff=from_units(difference))
+            continue
+
+        frappe.db.savepoint("zatca_gl_round_off")
+        try:
+            post_round_off(voucher, difference)
+        except Exception as e:
+            # e.g. a closed accounting period or a frozen account
+            frappe.db.rollback(save_point="zatca_gl_round_off")
+            log.error("repost_gl_precision", voucher.voucher_no, e)
+            continue
+
+        balanced += 1
+        log.adjustment("gl_round_off_posted", voucher.voucher_no, diff=from_units(difference))
+
+    return sum(voucher.entries for voucher in vouchers), balanced
+
+
+def get_round_off_allowance():
+    """Largest difference, in halalas, ERPNext itself rounds off on a Sales Invoice"""
+
+    from erpnext.accounts.general_ledger import get_debit_credit_allowance
+
+    return to_units(get_debit_credit_allowance("Sales Invoice", CURRENCY_PLACES))
+
+
+def post_round_off(voucher, difference):
+    """Post `difference` halalas (debit minus credit) of a voucher to the round-off account"""
+
+    from erpnext.accounts.general_ledger import make_entry, make_round_off_gle
+
+    # ERPNext builds the round-off row from the first entry of the map; a
+    # fresh one, so no posted entry can be taken for the round-off row
+    gl_map = [frappe._dict(
+        voucher_type="Sales Invoice",
+        voucher_no=voucher.voucher_no,
+        company=voucher.company,
+        posting_date=voucher.posting_date,
+        remarks=REMARKS,
+        is_opening="No",
+    )]
+    make_round_off_gle(gl_map, from_units(difference), CURRENCY_PLACES)
+
+    round_off = gl_map[-1]
+    round_off.fiscal_year = voucher.fiscal_year
+    make_entry(round_off, False, "No")
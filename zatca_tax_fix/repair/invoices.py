@@ -0,0 +1,241 @@
+"""Repair the stored totals of submitted Sales Invoices in bulk.
+
+Invoices are streamed in chunks ordered by name, their items and taxes read
+by plain queries into dicts, and the totals engine runs on those dicts; no
+Document is ever loaded. Only the columns the engine changed are written,
+one statement per doctype and chunk. Progress is stored and committed with
+every chunk, so a job that stops resumes after the last committed invoice.
+
+Only stored totals are repaired; GL entries are not reposted. Item amounts
+are taken as stored, never recomputed from rate and qty, and invoices the
+engine cannot repair from their stored columns alone are skipped: those with
+an Actual tax row, whose rate the engine would derive and rewrite, those with
+a document-level discount, and tax-inclusive ones, whose item amounts
+already include the tax. Invoices whose grand total would change are skipped
+as well: their GL and Payment Ledger Entries, rounded total and outstanding
+amount were all booked from the stored grand total, so only the split of an
+unchanged grand total into net and tax is repaired.
+"""
+
+import json
+
+import frappe
+from frappe.utils import cint
+
+from zatca_tax_fix.engine import log
+from zatca_tax_fix.engine.money import from_units, to_units
+from zatca_tax_fix.engine.totals import compute_totals
+from zatca_tax_fix.engine.writeback import (
+    HEADER_FIELDS,
+    PERSISTED_FIELDS,
+    TAX_FIELDS,
+    bulk_update,
+    get_changes,
+    get_values,
+)
+
+DEFAULT_CHUNK_SIZE = 500
+CHECKPOINT_PREFIX = "zatca_repair_checkpoint"
+
+# Columns the engine reads, plus the ones it may write back. Without rate and
+# qty the engine keeps the stored item amounts
+INVOICE_COLUMNS = (
+    'name', 'company', 'posting_date', 'conversion_rate', 'discount_amount', *HEADER_FIELDS)
+ITEM_COLUMNS = ('parent', 'amount')
+TAX_COLUMNS = (
+    'parent', 'name', 'charge_type', 'rate', 'account_head', 'included_in_print_rate', *TAX_FIELDS)
+
+
+def repair_invoices(company=None, from_date=None, to_date=None,
+                    chunk_size=DEFAULT_CHUNK_SIZE, restart=False):
+    """Recompute and persist the totals of submitted invoices, resuming from the checkpoint.
+
+    Returns the checkpoint: the last invoice processed and how many invoices
+    were scanned and repaired so far.
+    """
+
+    chunk_size = cint(chunk_size) or DEFAULT_CHUNK_SIZE
+    key = get_checkpoint_key(company, from_date, to_date)
+    checkpoint = new_checkpoint() if cint(restart) else get_checkpoint(key)
+
+    while not checkpoint["finished"]:
+        invoices = get_invoice_chunk(
+            checkpoint["last_name"], chunk_size, company, from_date, to_date)
+
+        if invoices:
+            checkpoint["repaired"] += repair_chunk(invoices)
+            checkpoint["scanned"] += len(invoices)
+            checkpoint["last_name"] = invoices[-1].name
+
+        checkpoint["finished"] = len(invoices) < chunk_size
+        save_checkpoint(key, checkpoint)
+        frappe.db.commit()
+
+        log.progress("repair_chunk", job=key, **checkpoint)
+
+    return checkpoint
+
+
+def get_invoice_chunk(last_name, chunk_size, company=None, from_date=None, to_date=None):
+    """Next `chunk_size` submitted invoices after `last_name`, by name"""
+
+    conditions = ["docstatus = 1", "name > %(last_name)s"]
+    if company:
+        conditions.append("company = %(company)s")
+    if from_date:
+        conditions.append("posting_date >= %(from_date)s")
+    if to_date:
+        conditions.append("posting_date <= %(to_date)s")
+
+    return frappe.db.sql(f"""
+        SELECT {", ".join(f"`{column}`" for column in INVOICE_COLUMNS)}
+        FROM `tabSales Invoice`
+        WHERE {" AND ".join(conditions)}
+        ORDER BY name
+        LIMIT %(limit)s
+    """, {
+        "last_name": last_name or "",
+        "company": company,
+        "from_date": from_date,
+        "to_date": to_date,
+        "limit": chunk_size,
+    }, as_dict=True)
+
+
+def repair_chunk(invoices):
+    """Repair a chunk of invoice dicts and write the changes; returns how many changed"""
+
+    names = tuple(invoice.name for invoice in invoices)
+    items = get_children("Sales Invoice Item", "items", ITEM_COLUMNS, names)
+    taxes = get_children("Sales Taxes and Charges", "taxes", TAX_COLUMNS, names)
+
+    pending = {}
+    repaired = 0
+
+    for invoice in invoices:
+        invoice["items"] = items.get(invoice.name)
+        invoice["taxes"] = taxes.get(invoice.name, [])
+
+        changes = repair_invoice(invoice)
+        if not changes:
+            continue
+
+        repaired += 1
+        for (doctype, name), fields in changes.items():
+            pending.setdefault(doctype, {})[name] = fields
+
+    for doctype, rows in pending.items():
+        bulk_update(doctype, PERSISTED_FIELDS[doctype], rows)
+
+    return repaired
+
+
+def repair_invoice(invoice):
+    """Run the totals engine on an invoice dict holding its `items` and `taxes`.
+
+    Returns the changed columns per (doctype, name), as `get_changes` does.
+    """
+
+    if not invoice.get("items"):
+        return {}
+
+    reason = get_skip_reason(invoice)
+    if reason:
+        log.adjustment("repair_skipped", invoice.name, reason=reason)
+        return {}
+
+    before = get_values(invoice)
+    grand_total = to_units(invoice.grand_total)
+    base_grand_total = to_units(invoice.base_grand_total)
+
+    compute_totals(invoice)
+
+    if (to_units(invoice.grand_total) != grand_total
+            or to_units(invoice.base_grand_total) != base_grand_total):
+        log.adjustment(
+            "repair_skipped", invoice.name, reason="grand_total",
+            grand_total=invoice.grand_total, stored=from_units(grand_total))
+        return {}
+
+    return get_changes(before, get_values(invoice))
+
+
+def get_skip_reason(invoice):
+    """Why the stored columns are not enough to repair the invoice, or None"""
+
+    if invoice.discount_amount:
+        return "discount"
+    if any(tax.charge_type == "Actual" for tax in invoice.taxes or ()):
+        return "actual_tax"
+    if any(tax.included_in_print_rate for tax in invoice.taxes or ()):
+        return "tax_inclusive"
+    return None
+
+
+def get_checkpoint_key(company=None, from_date=None, to_date=None, prefix=CHECKPOINT_PREFIX):
+    return ":".join((prefix, company or "", str(from_date or ""), str(to_date or "")))
+
+
+def get_checkpoint(key):
+    checkpoint = frappe.db.get_global(key)
+    return json.loads(checkpoint) if checkpoint else new_checkpoint()
+
+
+def save_checkpoint(key, checkpoint):
+    frappe.db.set_global(key, json.dumps(checkpoint))
+
+
+def enqueue_repair_job(company=None, from_date=None, to_date=None,
+                       chunk_size=DEFAULT_CHUNK_SIZE, restart=False):
+    """Run `repair_invoices` on the long queue, once per company and date range"""
+
+    key = get_checkpoint_key(company, from_date, to_date)
+    frappe.enqueue(
+        "zatca_tax_fix.repair.invoices.repair_invoices",
+        queue="long",
+        timeout=4 * 60 * 60,
+        job_id=key,
+        deduplicate=True,
+        company=company,
+        from_date=from_date,
+        to_date=to_date,
+        chunk_size=cint(chunk_size),
+        restart=cint(restart),
+    )
+
+    return key
+
+
+@frappe.whitelist()
+def enqueue_repair(company=None, from_date=None, to_date=None,
+                   chunk_size=DEFAULT_CHUNK_SIZE, restart=False):
+    frappe.only_for("System Manager")
+    return enqueue_repair_job(company, from_date, to_date, chunk_size, restart)
+
+
+@frappe.whitelist()
+def get_repair_progress(company=None, from_date=None, to_date=None):
+    frappe.only_for("System Manager")
+    return get_checkpoint(get_checkpoint_key(company, from_date, to_date))
+
+
+def new_checkpoint():
+    return {"last_name": "", "scanned": 0, "repaired": 0, "finished": False}
+
+
+def get_children(doctype, parentfield, columns, parents):
+    """Child rows of `parents` as dicts, grouped by parent in idx order"""
+
+    rows = frappe.db.sql(f"""
+        SELECT {", ".join(f"`{column}`" for column in columns)}
+        FROM `tab{doctype}`
+        WHERE parenttype = 'Sales Invoice' AND parentfield = %(parentfield)s
+            AND parent IN %(parents)s
+        ORDER BY parent, idx
+    """, {"parentfield": parentfield, "parents": parents}, as_dict=True)
+
+    children = {}
+    for row in rows:
+        children.setdefault(row.parent, []).append(row)
+
+    return children
@@ -0,0 +1,127 @@
+"""Run the bulk invoice repair over company and posting date partitions in parallel.
+
+Each partition is one company and one calendar period, repaired by
+`repair_invoices` in its own process with its own database connection and
+checkpoint. Partition boundaries only depend on the requested range and the
+period length, so a rerun resumes every partition where it stopped.
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import frappe
+from frappe.utils import add_days, add_months, get_first_day, getdate
+
+from zatca_tax_fix.engine import log
+from zatca_tax_fix.repair.invoices import DEFAULT_CHUNK_SIZE, repair_invoices
+
+DEFAULT_PERIOD_MONTHS = 1
+
+
+def repair_in_parallel(company=None, from_date=None, to_date=None, processes=None,
+                       period_months=DEFAULT_PERIOD_MONTHS, chunk_size=DEFAULT_CHUNK_SIZE,
+                       restart=False, on_progress=None):
+    """Repair every partition of the current site on a pool of `processes` workers.
+
+    `on_progress(result, totals)` is called in this process as each partition
+    finishes. Returns the merged totals, with the partitions that failed.
+    """
+
+    partitions = get_partitions(company, from_date, to_date, period_months)
+    totals = {"partitions": len(partitions), "done": 0, "scanned": 0, "repaired": 0, "failed": []}
+    if not partitions:
+        return totals
+
+    processes = min(processes or os.cpu_count() or 1, len(partitions))
+    site, sites_path = frappe.local.site, frappe.local.sites_path
+
+    # Workers connect on their own; a forked copy of this connection must not be shared
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=processes, mp_context=context) as pool:
+        futures = [
+            pool.submit(_repair_partition, site, sites_path, partition, chunk_size, restart)
+            for partition in partitions
+        ]
+
+        for future in as_completed(futures):
+            result = future.result()
+            totals["done"] += 1
+
+            if result["error"]:
+                totals["failed"].append(result)
+            else:
+                totals["scanned"] += result["scanned"]
+                totals["repaired"] += result["repaired"]
+
+            log.progress(
+                "repair_partition", company=result["company"], from_date=result["from_date"],
+                to_date=result["to_date"], scanned=result["scanned"], repaired=result["repaired"],
+                error=result["error"], done=totals["done"], partitions=totals["partitions"],
+            )
+            if on_progress:
+                on_progress(result, totals)
+
+    return totals
+
+
+def get_partitions(company=None, from_date=None, to_date=None, period_months=DEFAULT_PERIOD_MONTHS):
+    """(company, from_date, to_date) ranges of calendar periods holding submitted invoices"""
+
+    conditions = ["docstatus = 1"]
+    if company:
+        conditions.append("company = %(company)s")
+    if from_date:
+        conditions.append("posting_date >= %(from_date)s")
+    if to_date:
+        conditions.append("posting_date <= %(to_date)s")
+
+    ranges = frappe.db.sql(f"""
+        SELECT company, MIN(posting_date), MAX(posting_date)
+        FROM `tabSales Invoice`
+        WHERE {" AND ".join(conditions)}
+        GROUP BY company
+        ORDER BY company
+    """, {"company": company, "from_date": from_date, "to_date": to_date})
+
+    period_months = max(int(period_months or DEFAULT_PERIOD_MONTHS), 1)
+    partitions = []
+
+    for company_name, first_date, last_date in ranges:
+        start = get_first_day(first_date)
+        while start <= last_date:
+            end = add_days(add_months(start, period_months), -1)
+            partitions.append((
+                company_name,
+                max(start, getdate(from_date)) if from_date else start,
+                min(end, getdate(to_date)) if to_date else end,
+            ))
+            start = add_months(start, period_months)
+
+    return partitions
+
+
+def _repair_partition(site, sites_path, partition, chunk_size, restart):
+    """Worker process: repair one partition on a connection of its own"""
+
+    company, from_date, to_date = partition
+    result = {
+        "company": company, "from_date": str(from_date), "to_date": str(to_date),
+        "scanned": 0, "repaired": 0, "error": None,
+    }
+
+    frappe.init(site=site, sites_path=sites_path)
+    frappe.connect()
+    try:
+        checkpoint = repair_invoices(company, from_date, to_date, chunk_size, restart)
+        result["scanned"] = checkpoint["scanned"]
+        result["repaired"] = checkpoint["repaired"]
+    except Exception as e:
+        frappe.db.rollback()
+        result["error"] = str(e)
+        frappe.log_error(f"ZATCA invoice repair failed for {company} {from_date}..{to_date}: {e}")
+        frappe.db.commit()
+    finally:
+        frappe.destroy()
+
+    return result
@@ -0,0 +1,35 @@
+"""Largest-remainder distribution of whole halalas:
+
+    python -m unittest zatca_tax_fix.tests.test_allocation
+"""
+
+import unittest
+
+from zatca_tax_fix.engine.allocation import distribute
+
+
+class TestDistribute(unittest.TestCase):
+    def test_shares_add_up_to_the_total(self):
+        for total in (0, 1, 7, -7, 100, -101):
+            for weights in ([1], [1, 1, 1], [5, 3, 2], [333, 333, 334], [0, 10, 0]):
+                with self.subTest(total=total, weights=weights):
+                    self.assertEqual(sum(distribute(total, weights)), total)
+
+    def test_leftover_units_go_to_the_largest_remainders(self):
+        self.assertEqual(distribute(10, [1, 1, 1]), [4, 3, 3])
+        self.assertEqual(distribute(-10, [1, 1, 1]), [-4, -3, -3])
+        self.assertEqual(distribute(5, [10, 20, 30, 40]), [0, 1, 2, 2])
+
+    def test_zero_weights_split_evenly(self):
+        self.assertEqual(distribute(3, [0, 0, 0]), [1, 1, 1])
+
+    def test_no_weights(self):
+        self.assertEqual(distribute(5, []), [])
+
+    def test_negative_weights_are_rejected(self):
+        with self.assertRaises(ValueError):
+            distribute(4, [5, -5, 2])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+"""The engine's shortcuts against a full computation on a fixed set of seeds.
+
+Runs under `bench run-tests --app zatca_tax_fix` and, without a bench, on the
+benchmark stand-ins:
+
+    python -m unittest zatca_tax_fix.tests.test_equivalence
+"""
+
+import importlib.util
+import unittest
+from unittest.mock import patch
+
+from zatca_tax_fix.benchmarks import equivalence, generator, standins
+
+if importlib.util.find_spec("frappe") is None:
+    standins.install()
+
+from zatca_tax_fix.engine import vectorized
+from zatca_tax_fix.engine.vat_accounts import OTHER_TAX, VAT
+
+CASES = 60
+SEED = 0
+
+# The generator's accounts, so the checks don't depend on the site's chart
+CLASSIFICATION = {
+    generator.VAT_ACCOUNT: VAT,
+    **dict.fromkeys(generator.OTHER_ACCOUNTS, OTHER_TAX),
+}
+
+
+class TestEquivalence(unittest.TestCase):
+    def setUp(self):
+        patcher = patch(
+            "zatca_tax_fix.engine.totals.get_classification", return_value=CLASSIFICATION
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @unittest.skipUnless(vectorized.np, "NumPy is not installed")
+    def test_batch_path_matches_python_path(self):
+        self.assertEqual(equivalence.compare(CASES, SEED), [])
+
+    def test_incremental_pass_matches_full_pass(self):
+        self.assertEqual(equivalence.compare_incremental(CASES, SEED), [])
+
+    def test_standard_path_matches_full_computation(self):
+        self.assertEqual(equivalence.compare_standard(CASES, SEED), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+"""GL entry merging and balancing, on hand-built entries.
+
+Runs under `bench run-tests --app zatca_tax_fix` and, without a bench, on the
+benchmark stand-ins:
+
+    python -m unittest zatca_tax_fix.tests.test_gl
+"""
+
+import importlib.util
+import unittest
+
+from zatca_tax_fix.benchmarks import standins
+
+if importlib.util.find_spec("frappe") is None:
+    standins.install()
+
+import frappe
+
+from zatca_tax_fix.engine.gl import fix_gl_entries_precision, merge_gl_entries
+
+VOUCHER = {"voucher_type": "Sales Invoice", "voucher_no": "ACC-SINV-0001"}
+
+
+def make_entry(account, debit=0, credit=0, **fields):
+    return frappe._dict(
+        VOUCHER, account=account, debit=debit, credit=credit,
+        debit_in_account_currency=debit, credit_in_account_currency=credit, **fields)
+
+
+class TestMergeGLEntries(unittest.TestCase):
+    def test_paid_pos_invoice_keeps_both_receivable_rows(self):
+        party = {"party_type": "Customer", "party": "Walk-in Customer"}
+        gl_entries = [
+            make_entry("Debtors - BT", debit=115, **party),
+            make_entry("Sales - BT", credit=60),
+            make_entry("Sales - BT", credit=40),
+            make_entry("VAT 15% - BT", credit=15),
+            # Added by ERPNext's make_pos_gl_entries
+            make_entry("Debtors - BT", credit=115, **party),
+            make_entry("Cash - BT", debit=115),
+        ]
+
+        merged = merge_gl_entries(gl_entries)
+
+        receivable = [(entry.debit, entry.credit) for entry in merged if entry.account == "Debtors - BT"]
+        self.assertEqual(receivable, [(115, 0), (0, 115)])
+        other = [(entry.account, entry.credit) for entry in merged if entry.account != "Debtors - BT"]
+        self.assertEqual(other, [("Sales - BT", 100), ("VAT 15% - BT", 15), ("Cash - BT", 0)])
+        self.assertEqual(sum(entry.debit for entry in merged), sum(entry.credit for entry in merged))
+
+    def test_merged_row_keeps_the_net_of_debit_and_credit(self):
+        merged = merge_gl_entries([
+            make_entry("Sales - BT", credit=100.004),
+            make_entry("Sales - BT", debit=30.002),
+            make_entry("Discount - BT", debit=5),
+            make_entry("Discount - BT", credit=5),
+        ])
+
+        self.assertEqual(len(merged), 1)
+        self.assertEqual(merged[0].debit, 0)
+        self.assertAlmostEqual(merged[0].credit, 70.002)
+        self.assertEqual(merged[0].debit_in_account_currency, 0)
+        self.assertAlmostEqual(merged[0].credit_in_account_currency, 70.002)
+
+    def test_rows_apart_on_a_merge_property_stay_apart(self):
+        merged = merge_gl_entries([
+            make_entry("Sales - BT", credit=10, cost_center="Main - BT"),
+            make_entry("Sales - BT", credit=10, cost_center="Riyadh - BT"),
+            make_entry("Sales - BT", credit=10, cost_center="Main - BT", voucher_detail_no="row-2"),
+        ])
+
+        self.assertEqual(len(merged), 3)
+
+
+
+class TestFixGLEntriesPrecision(unittest.TestCase):
+    def assertBalanced(self, gl_entries):
+        self.assertAlmostEqual(
+            sum(entry.debit for entry in gl_entries), sum(entry.credit for entry in gl_entries), places=9)
+
+    def test_rounding_difference_is_spread_over_the_side_that_has_to_grow(self):
+        gl_entries = [
+            make_entry("Debtors - BT", debit=100.005),
+            make_entry("Sales - BT", credit=33.335),
+            make_entry("Sales - BT", credit=33.335, cost_center="Riyadh - BT"),
+            make_entry("VAT 15% - BT", credit=33.335),
+        ]
+
+        self.assertEqual(fix_gl_entries_precision(gl_entries, merge=False), -1)
+        self.assertEqual(gl_entries[0].debit, 100.02)
+        self.assertEqual(gl_entries[0].debit_in_account_currency, 100.02)
+        self.assertEqual([entry.credit for entry in gl_entries[1:]], [33.34, 33.34, 33.34])
+        self.assertBalanced(gl_entries)
+
+    def test_signed_amounts_of_a_credit_note_are_weighted_by_magnitude(self):
+        gl_entries = [
+            make_entry("Debtors - BT", debit=30),
+            make_entry("Sales - BT", credit=-100.005),
+            make_entry("Sales - BT", credit=130.001, cost_center="Riyadh - BT"),
+        ]
+
+        self.assertEqual(fix_gl_entries_precision(gl_entries, merge=False), 1)
+        # One halala, to the larger magnitude, not shares larger than the difference
+        self.assertEqual([entry.credit for entry in gl_entries[1:]], [-100.01, 130.01])
+        self.assertBalanced(gl_entries)
+
+    def test_other_side_shrinks_when_the_needed_side_has_no_entries(self):
+        # Still signed: ERPNext moves the negative debit to credit when posting
+        gl_entries = [
+            make_entry("Debtors - BT", debit=100.005),
+            make_entry("Sales - BT", debit=-100.004),
+        ]
+
+        self.assertEqual(fix_gl_entries_precision(gl_entries, merge=False), 1)
+        self.assertEqual([entry.debit for entry in gl_entries], [100.0, -100.0])
+        self.assertBalanced(gl_entries)
+
+    def test_balanced_entries_are_only_rounded(self):
+        gl_entries = [
+            make_entry("Debtors - BT", debit=115.0),
+            make_entry("Sales - BT", credit=100.0),
+            make_entry("VAT 15% - BT", credit=15.0),
+        ]
+
+        self.assertEqual(fix_gl_entries_precision(gl_entries, merge=False), 0)
+        self.assertEqual([entry.credit for entry in gl_entries[1:]], [100.0, 15.0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,38 @@
+"""Parity of `engine.money.round_amount` with the site's `frappe.utils.flt`.
+
+Needs a real frappe, so it runs under `bench run-tests --app zatca_tax_fix`
+and is skipped elsewhere.
+"""
+
+import unittest
+
+try:
+    import frappe
+except ImportError:
+    frappe = None
+
+from zatca_tax_fix.benchmarks.rounding import compare, make_values
+
+LEGACY_ROUNDING = (None, "", "Banker's Rounding (legacy)")
+
+
+def get_rounding_method():
+    """The site's `rounding_method` (v15 System Settings); None before v15"""
+    return frappe.get_system_settings("rounding_method")
+
+
+@unittest.skipIf(
+    frappe is None or getattr(frappe, "is_stand_in", False), "needs frappe.utils.flt from a bench"
+)
+class TestRounding(unittest.TestCase):
+    def test_round_amount_matches_flt(self):
+        from frappe.utils import flt
+
+        if get_rounding_method() not in LEGACY_ROUNDING:
+            self.skipTest("the site rounds with a non-legacy rounding_method")
+
+        self.assertEqual(compare(make_values(20000, seed=0), flt=flt), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
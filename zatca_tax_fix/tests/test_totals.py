@@ -0,0 +1,63 @@
+"""Skipping repeated passes of the totals engine.
+
+Runs under `bench run-tests --app zatca_tax_fix` and, without a bench, on the
+benchmark stand-ins:
+
+    python -m unittest zatca_tax_fix.tests.test_totals
+"""
+
+import importlib.util
+import unittest
+from unittest.mock import patch
+
+from zatca_tax_fix.benchmarks import generator, standins
+
+if importlib.util.find_spec("frappe") is None:
+    standins.install()
+
+from zatca_tax_fix.engine.totals import apply_totals
+from zatca_tax_fix.engine.vat_accounts import OTHER_TAX, VAT
+
+CLASSIFICATION = {
+    generator.VAT_ACCOUNT: VAT,
+    **dict.fromkeys(generator.OTHER_ACCOUNTS, OTHER_TAX),
+}
+
+
+class TestApplyTotals(unittest.TestCase):
+    def setUp(self):
+        patcher = patch(
+            "zatca_tax_fix.engine.totals.get_classification", return_value=CLASSIFICATION
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_base_amounts_rewritten_by_erpnext_are_restored(self):
+        invoice = generator.make_invoice(items=20, tax_rows=2, currency="USD", seed=3)
+        apply_totals(invoice, "before_validate")
+        base_grand_total = invoice.base_grand_total
+        base_amount = invoice.items[0].base_amount
+        base_tax_amount = invoice.taxes[0].base_tax_amount
+
+        # calculate_taxes_and_totals in validate, on unchanged transaction amounts
+        invoice.base_grand_total += 0.02
+        invoice.items[0].base_amount += 0.01
+        invoice.taxes[0].base_tax_amount -= 0.01
+        apply_totals(invoice, "validate")
+
+        self.assertEqual(invoice.base_grand_total, base_grand_total)
+        self.assertEqual(invoice.items[0].base_amount, base_amount)
+        self.assertEqual(invoice.taxes[0].base_tax_amount, base_tax_amount)
+
+    def test_unchanged_invoice_is_not_recomputed(self):
+        invoice = generator.make_invoice(items=20, seed=3)
+        apply_totals(invoice, "validate")
+
+        with patch("zatca_tax_fix.engine.totals.compute_totals") as compute_totals:
+            apply_totals(invoice, "before_save")
+
+        compute_totals.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+"""One row per submitted Sales Invoice with its document and item-wise VAT.
+
+Rows are upserted on submit, deleted on cancel and back-filled for older
+invoices by `backfill`, so reconciliation dashboards query this table
+instead of aggregating invoice items.
+"""
+
+import hashlib
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import cint, now
+
+from zatca_tax_fix.engine import log
+from zatca_tax_fix.engine.money import from_units, to_units
+from zatca_tax_fix.engine.totals import get_item_wise_vat, get_vat_row
+from zatca_tax_fix.engine.vat_accounts import get_classification
+from zatca_tax_fix.repair.invoices import (
+    DEFAULT_CHUNK_SIZE,
+    get_checkpoint,
+    get_children,
+    get_invoice_chunk,
+    new_checkpoint,
+    save_checkpoint,
+)
+
+DOCTYPE = "ZATCA VAT Reconciliation"
+BACKFILL_CHECKPOINT_KEY = "zatca_vat_reconciliation_backfill"
+
+COLUMNS = (
+    'invoice', 'company', 'posting_date', 'net_total', 'grand_total', 'document_vat',
+    'item_wise_vat', 'difference', 'has_difference', 'fingerprint'
+)
+
+
+class ZATCAVATReconciliation(Document):
+    pass
+
+
+def on_doctype_update():
+    # Dashboards filter on company and, mostly, on the drifted invoices of a period
+    frappe.db.add_index(DOCTYPE, ["company", "has_difference", "posting_date"])
+
+
+def update_reconciliation(invoice):
+    """Insert or refresh the row of a submitted invoice"""
+    upsert([get_summary(invoice)])
+
+
+def remove_reconciliation(invoice_name):
+    frappe.db.sql(f"DELETE FROM `tab{DOCTYPE}` WHERE name = %s", invoice_name)
+
+
+def get_summary(invoice):
+    """Row values, in COLUMNS order, of a Document or a dict holding `items` and `taxes`"""
+
+    amounts = [to_units(item.amount) for item in invoice.get("items") or []]
+    vat_tax = get_vat_row(invoice.get("taxes") or [], get_classification(invoice.company))
+
+    document_vat = to_units(vat_tax.tax_amount) if vat_tax else 0
+    item_wise_vat = get_item_wise_vat(vat_tax, amounts) if vat_tax else 0
+    difference = item_wise_vat - document_vat
+
+    amounts_in_units = (
+        to_units(invoice.net_total), to_units(invoice.grand_total),
+        document_vat, item_wise_vat, difference,
+    )
+    fingerprint = hashlib.sha1(repr((amounts_in_units, amounts)).encode()).hexdigest()[:20]
+
+    return (
+        invoice.name, invoice.company, invoice.posting_date,
+        *(from_units(units) for units in amounts_in_units),
+        1 if difference else 0, fingerprint,
+    )
+
+
+def upsert(rows):
+    """Insert or update rows from `get_summary` in one statement"""
+
+    if not rows:
+        return
+
+    timestamp = now()
+    user = frappe.session.user
+    columns = ("name", "creation", "modified", "owner", "modified_by", "docstatus", *COLUMNS)
+    updates = ("modified", "modified_by", *COLUMNS[1:])
+
+    values = []
+    for row in rows:
+        values.extend((row[0], timestamp, timestamp, user, user, 0, *row))
+
+    placeholders = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    frappe.db.sql(f"""
+        INSERT INTO `tab{DOCTYPE}` ({", ".join(f"`{column}`" for column in columns)})
+        VALUES {", ".join([placeholders] * len(rows))}
+        ON DUPLICATE KEY UPDATE {", ".join(f"`{column}` = VALUES(`{column}`)" for column in updates)}
+    """, values)
+
+
+def backfill(chunk_size=DEFAULT_CHUNK_SIZE, restart=False):
+    """Add or refresh the rows of every submitted invoice, resuming from the checkpoint"""
+
+    chunk_size = cint(chunk_size) or DEFAULT_CHUNK_SIZE
+    checkpoint = new_checkpoint() if cint(restart) else get_checkpoint(BACKFILL_CHECKPOINT_KEY)
+
+    while not checkpoint["finished"]:
+        invoices = get_invoice_chunk(checkpoint["last_name"], chunk_size)
+
+        if invoices:
+            names = tuple(invoice.name for invoice in invoices)
+            items = get_children("Sales Invoice Item", "items", ('parent', 'amount'), names)
+            taxes = get_children(
+                "Sales Taxes and Charges", "taxes",
+                ('parent', 'rate', 'tax_amount', 'account_head'), names)
+
+            rows = []
+            for invoice in invoices:
+                invoice["items"] = items.get(invoice.name)
+                invoice["taxes"] = taxes.get(invoice.name)
+                rows.append(get_summary(invoice))
+
+            upsert(rows)
+            checkpoint["scanned"] += len(invoices)
+            checkpoint["last_name"] = invoices[-1].name
+
+        checkpoint["finished"] = len(invoices) < chunk_size
+        save_checkpoint(BACKFILL_CHECKPOINT_KEY, checkpoint)
+        frappe.db.commit()
+
+        log.progress("reconciliation_backfill", **checkpoint)
+
+    return checkpoint
+
+
+@frappe.whitelist()
+def enqueue_backfill(chunk_size=DEFAULT_CHUNK_SIZE, restart=False):
+    frappe.only_for("System Manager")
+    frappe.enqueue(
+        "zatca_tax_fix.zatca_tax_fix.doctype.zatca_vat_reconciliation.zatca_vat_reconciliation.backfill",
+        queue="long",
+        timeout=4 * 60 * 60,
+        job_id=BACKFILL_CHECKPOINT_KEY,
+        deduplicate=True,
+        chunk_size=cint(chunk_size),
+        restart=cint(restart),
+    )
@@ -0,0 +1,38 @@
+from frappe import _
+
+from zatca_tax_fix.repair.audit import get_drift_summary, get_drifted_invoices
+
+
+def execute(filters=None):
+    filters = filters or {}
+    company, from_date, to_date = filters.get("company"), filters.get("from_date"), filters.get("to_date")
+
+    summary = get_drift_summary(company, from_date, to_date)
+    data = get_drifted_invoices(company, from_date, to_date, page_length=0)
+
+    return get_columns(), data, None, None, get_report_summary(summary)
+
+
+def get_columns():
+    return [
+        {"fieldname": "invoice", "label": _("Sales Invoice"), "fieldtype": "Link",
+         "options": "Sales Invoice", "width": 180},
+        {"fieldname": "company", "label": _("Company"), "fieldtype": "Link",
+         "options": "Company", "width": 160},
+        {"fieldname": "posting_date", "label": _("Posting Date"), "fieldtype": "Date", "width": 110},
+        {"fieldname": "document_vat", "label": _("Document VAT"), "fieldtype": "Float",
+         "precision": 2, "width": 130},
+        {"fieldname": "item_wise_vat", "label": _("Item-wise VAT"), "fieldtype": "Float",
+         "precision": 2, "width": 130},
+        {"fieldname": "diff", "label": _("Difference"), "fieldtype": "Float",
+         "precision": 2, "width": 110},
+    ]
+
+
+def get_report_summary(summary):
+    return [
+        {"value": summary.invoices, "label": _("Invoices with VAT drift"), "datatype": "Int",
+         "indicator": "Red" if summary.invoices else "Green"},
+        {"value": summary.total_diff, "label": _("Total Difference"), "datatype": "Float"},
+        {"value": summary.absolute_diff, "label": _("Absolute Difference"), "datatype": "Float"},
+    ]